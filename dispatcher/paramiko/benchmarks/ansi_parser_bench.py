@@ -0,0 +1,57 @@
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils import ansi_sequences
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 4096
+SIZES_MB = [1, 2, 4, 8]
+LEGACY_SIZES_KB = [64, 128, 256]
+
+def _make_flood(size: int) -> bytes:
+  line = "\x1b[01;34m" + "A7f=" * 18 + "\x1b[0m é\r\n"
+  data = line.encode("utf-8") * (size // len(line.encode("utf-8")) + 1)
+  return data[:size] + b"\x1b[4lroot@svr04:~# "
+
+def _chunks(data: bytes):
+  for i in range(0, len(data), CHUNK_SIZE):
+    yield data[i:i + CHUNK_SIZE]
+
+def run_parser(data: bytes) -> float:
+  started = time.perf_counter()
+  parser = ansi_sequences.TerminalStreamParser("cat /dev/urandom | head")
+  for chunk in _chunks(data):
+    parser.feed(chunk)
+    if parser.prompt_seen:
+      break
+  parser.output()
+  return time.perf_counter() - started
+
+def run_legacy(data: bytes) -> float:
+  started = time.perf_counter()
+  output = b""
+  for chunk in _chunks(data):
+    output += chunk
+    ansi_sequences.strip_ansi_sequences(output.decode("utf-8", errors="ignore"))
+  return time.perf_counter() - started
+
+def main():
+  logger.info("TerminalStreamParser (%s-byte chunks)", CHUNK_SIZE)
+  for size_mb in SIZES_MB:
+    elapsed = run_parser(_make_flood(size_mb * 1024 * 1024))
+    logger.info("  %4d MiB  %8.3f s  %8.1f MiB/s", size_mb, elapsed, size_mb / elapsed)
+
+  logger.info("Legacy decode+strip of the growing buffer per chunk")
+  for size_kb in LEGACY_SIZES_KB:
+    elapsed = run_legacy(_make_flood(size_kb * 1024))
+    logger.info("  %4d KiB  %8.3f s", size_kb, elapsed)
+
+if __name__ == "__main__":
+  main()
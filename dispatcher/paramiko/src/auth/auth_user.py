@@ -1,30 +1,92 @@
 import logging
+import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+USER_FILE = os.getenv("AUTH_USER_FILE", "./config/user.txt")
+RELOAD_CHECK_INTERVAL = float(os.getenv("AUTH_RELOAD_CHECK_INTERVAL", "1.0"))
+
+class RuleSet:
+  def __init__(self, rules: list):
+    self.exact = {}
+    self.wildcard = None
+
+    for index, (user, passwd) in enumerate(rules):
+      if user == "*":
+        if self.wildcard is None:
+          self.wildcard = (index, passwd)
+      elif user not in self.exact:
+        self.exact[user] = (index, passwd)
+
+  def match(self, username: str):
+    rule = self.exact.get(username)
+    if rule is None or (self.wildcard is not None and self.wildcard[0] < rule[0]):
+      rule = self.wildcard
+    return rule[1] if rule is not None else None
+
 class Authenticator:
-  def __init__(self, user_file="./config/user.txt"):
-    self.rules = []
-
-    try:
-      with open(user_file, "r") as f:
-        for line in f:
-          line = line.strip()
-          if not line or ":" not in line or line.startswith("#"):
-            continue
-          user, passwd = line.split(":", 1)
-          self.rules.append((user, passwd))
-    except FileNotFoundError:
-      logger.warning("User file '%s' not found.", user_file)
-      self.rules = []
+  def __init__(self, user_file=USER_FILE):
+    self.user_file = user_file
+    self._lock = threading.Lock()
+    self._mtime = None
+    self._checked_at = 0.0
+    self._ruleset = RuleSet([])
+    self.reload()
+
+  def reload(self, force: bool = True):
+    with self._lock:
+      self._checked_at = time.monotonic()
+
+      try:
+        mtime = os.stat(self.user_file).st_mtime_ns
+      except FileNotFoundError:
+        if self._mtime is not None or force:
+          logger.warning("User file '%s' not found.", self.user_file)
+          self._ruleset = RuleSet([])
+          self._mtime = None
+        return
+
+      if not force and mtime == self._mtime:
+        return
+
+      rules = []
+      try:
+        with open(self.user_file, "r") as f:
+          for line in f:
+            line = line.strip()
+            if not line or ":" not in line or line.startswith("#"):
+              continue
+            user, passwd = line.split(":", 1)
+            rules.append((user, passwd))
+      except FileNotFoundError:
+        logger.warning("User file '%s' not found.", self.user_file)
+
+      self._ruleset = RuleSet(rules)
+      self._mtime = mtime
+      logger.info("Loaded %s auth rules from %s", len(rules), self.user_file)
 
   def authenticate(self, username: str, password: str) -> bool:
-    for rule_user, rule_pass in self.rules:
-      if rule_user == username or rule_user == "*":
-        if rule_pass == "*":
-          return True
-        elif rule_pass.startswith("!"):
-          return password != rule_pass[1:]
-        else:
-          return password == rule_pass
-    return False
+    if time.monotonic() - self._checked_at >= RELOAD_CHECK_INTERVAL:
+      self.reload(force=False)
+
+    rule_pass = self._ruleset.match(username)
+    if rule_pass is None:
+      return False
+    if rule_pass == "*":
+      return True
+    if rule_pass.startswith("!"):
+      return password != rule_pass[1:]
+    return password == rule_pass
+
+_authenticator = None
+_authenticator_lock = threading.Lock()
+
+def get_authenticator() -> Authenticator:
+  global _authenticator
+  if _authenticator is None:
+    with _authenticator_lock:
+      if _authenticator is None:
+        _authenticator = Authenticator()
+  return _authenticator
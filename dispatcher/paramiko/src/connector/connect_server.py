@@ -1,12 +1,43 @@
-from utils import ansi_sequences, resource_manager
+from utils import ansi_sequences, resource_manager, stats_reporter
 import logging
+import os
 import socket as sock_module
+import threading
+import collections
 import paramiko
 import re
 import time
+import select
 
 logger = logging.getLogger(__name__)
 
+CLEAR_LINE_KEYS = "\x05\x15"
+
+PROMPT_SCAN_RE = re.compile(rb"[\w.-]+@[\w.-]+:[^\r\n$#]*[$#] ")
+PROMPT_WINDOW = 512
+READ_SIZE = 4096
+SHELL_TIMEOUT = 5.0
+TAB_TIMEOUT = 1.0
+TAB_SETTLE_SECONDS = 0.15
+EXEC_TIMEOUT = float(os.getenv("EXEC_TIMEOUT", "30"))
+EXEC_STATUS_TIMEOUT = 2.0
+EXEC_LOST_STATUS = 255
+
+POOL_SIZE = int(os.getenv("COWRIE_POOL_SIZE", "2"))
+POOL_IDLE_SECONDS = float(os.getenv("COWRIE_POOL_IDLE_SECONDS", "60"))
+POOL_MAINTAIN_INTERVAL = 5.0
+POOL_MAX_BACKOFF = 30.0
+CONNECT_TIMEOUT = 10
+
+LOGIN_REUSE_TRANSPORTS = os.getenv("LOGIN_MIRROR_REUSE", "1") == "1"
+LOGIN_TRANSPORTS_PER_BACKEND = int(os.getenv("LOGIN_MIRROR_TRANSPORTS", "4"))
+LOGIN_TRANSPORT_IDLE_SECONDS = 30.0
+AUTH_NOT_SENT_ERROR = "No existing session"
+
+_pools = {}
+_pools_lock = threading.Lock()
+_login_transports = {}
+
 def fetch_server_version(host: str, port: int = 2222, timeout: float = 5.0) -> str:
   sock = None
   try:
@@ -38,12 +69,301 @@ def fetch_server_version(host: str, port: int = 2222, timeout: float = 5.0) -> s
       except Exception:
         pass
 
+def _connect_transport(host: str, port: int) -> paramiko.Transport:
+  sock = None
+  transport = None
+
+  try:
+    sock = sock_module.create_connection((host, port), timeout=CONNECT_TIMEOUT)
+    transport = paramiko.Transport(sock)
+    transport.start_client(timeout=CONNECT_TIMEOUT)
+    return transport
+
+  except Exception:
+    resource_manager.close_proxy_connection(transport=transport, client=sock)
+    raise
+
+class TransportPool:
+  def __init__(self, host: str, port: int, size: int = POOL_SIZE, idle_seconds: float = POOL_IDLE_SECONDS, server_version: str = None):
+    self.host = host
+    self.port = port
+    self.size = max(0, size)
+    self.idle_seconds = idle_seconds
+    self.server_version = server_version
+    self._idle = collections.deque()
+    self._lock = threading.Lock()
+    self._wake = threading.Event()
+    self._stop = threading.Event()
+    self._thread = None
+    self._hits = 0
+    self._misses = 0
+    self._evictions = 0
+    self._wait_seconds = 0.0
+
+  def start(self):
+    if self._thread is not None:
+      return
+    self._thread = threading.Thread(target=self._maintain, daemon=True)
+    self._thread.start()
+
+  def stop(self):
+    self._stop.set()
+    self._wake.set()
+    self.flush("pool stopped")
+
+  def acquire(self) -> paramiko.Transport:
+    started = time.monotonic()
+    transport = None
+
+    with self._lock:
+      while self._idle:
+        candidate, created_at = self._idle.popleft()
+        if self._is_usable(candidate, created_at):
+          transport = candidate
+          break
+        self._evictions += 1
+        resource_manager.close_transport(candidate)
+
+    self._wake.set()
+    hit = transport is not None
+
+    try:
+      if transport is None:
+        transport = _connect_transport(self.host, self.port)
+      return transport
+
+    finally:
+      with self._lock:
+        if hit:
+          self._hits += 1
+        else:
+          self._misses += 1
+        self._wait_seconds += time.monotonic() - started
+
+  def flush(self, reason: str):
+    with self._lock:
+      stale = list(self._idle)
+      self._idle.clear()
+      self._evictions += len(stale)
+
+    for transport, _ in stale:
+      resource_manager.close_transport(transport)
+
+    if stale:
+      logger.info("Evicted %s pooled transports to %s:%s (%s)", len(stale), self.host, self.port, reason)
+
+  def stats(self) -> dict:
+    with self._lock:
+      lookups = self._hits + self._misses
+      return {
+        "idle": len(self._idle),
+        "size": self.size,
+        "hits": self._hits,
+        "misses": self._misses,
+        "evictions": self._evictions,
+        "wait_seconds_total": round(self._wait_seconds, 6),
+        "wait_seconds_avg": round(self._wait_seconds / lookups, 6) if lookups else 0.0,
+      }
+
+  def _is_usable(self, transport, created_at: float) -> bool:
+    if not transport.is_active() or transport.is_authenticated():
+      return False
+    return time.monotonic() - created_at < self.idle_seconds
+
+  def _prune(self) -> bool:
+    dead = False
+    expired = []
+
+    with self._lock:
+      kept = collections.deque()
+      for transport, created_at in self._idle:
+        if not transport.is_active():
+          dead = True
+          expired.append(transport)
+        elif time.monotonic() - created_at >= self.idle_seconds:
+          expired.append(transport)
+        else:
+          kept.append((transport, created_at))
+      self._idle = kept
+      self._evictions += len(expired)
+
+    for transport in expired:
+      resource_manager.close_transport(transport)
+
+    return dead
+
+  def _fill(self):
+    while not self._stop.is_set():
+      with self._lock:
+        if len(self._idle) >= self.size:
+          return
+
+      transport = _connect_transport(self.host, self.port)
+      version = transport.remote_version
+
+      if self.server_version and version != self.server_version and self._idle:
+        logger.info("Backend %s:%s version changed: %s -> %s", self.host, self.port, self.server_version, version)
+        self.flush("backend restarted")
+      self.server_version = version
+
+      with self._lock:
+        self._idle.append((transport, time.monotonic()))
+
+  def _maintain(self):
+    backoff = POOL_MAINTAIN_INTERVAL
+
+    while not self._stop.is_set():
+      try:
+        if self._prune():
+          self.flush("backend connection lost")
+          self.server_version = fetch_server_version(self.host, self.port)
+        self._fill()
+        backoff = POOL_MAINTAIN_INTERVAL
+      except Exception:
+        logger.debug("Failed to refill transport pool for %s:%s", self.host, self.port, exc_info=True)
+        backoff = min(backoff * 2, POOL_MAX_BACKOFF)
+
+      self._wake.wait(backoff)
+      self._wake.clear()
+
+def start_transport_pool(host: str, port: int, server_version: str = None, size: int = POOL_SIZE) -> TransportPool:
+  with _pools_lock:
+    pool = _pools.get((host, port))
+    if pool is None:
+      pool = TransportPool(host, port, size=size, server_version=server_version)
+      _pools[(host, port)] = pool
+      stats_reporter.register(f"transport_pool {host}:{port}", pool.stats)
+  if pool.size > 0:
+    pool.start()
+  return pool
+
+def get_transport_pool(host: str, port: int) -> TransportPool:
+  with _pools_lock:
+    return _pools.get((host, port))
+
+class LoginTransportSet:
+  def __init__(self, host: str, port: int, max_transports: int = LOGIN_TRANSPORTS_PER_BACKEND, idle_seconds: float = LOGIN_TRANSPORT_IDLE_SECONDS):
+    self.host = host
+    self.port = port
+    self.max_transports = max(1, max_transports)
+    self.idle_seconds = idle_seconds
+    self._idle = collections.deque()
+    self._lock = threading.Lock()
+    self._attempts = 0
+    self._handshakes = 0
+    self._reconnects = 0
+
+  def record(self, username: str, password: str) -> bool:
+    while True:
+      transport, reused = self._checkout()
+
+      if reused and not transport.is_active():
+        resource_manager.close_transport(transport)
+        self._count_reconnect()
+        continue
+
+      try:
+        transport.auth_password(username, password)
+      except paramiko.AuthenticationException:
+        self._count_attempt()
+        if transport.is_active():
+          self._checkin(transport)
+        else:
+          resource_manager.close_transport(transport)
+        return False
+      except paramiko.SSHException as e:
+        resource_manager.close_transport(transport)
+        if not reused or str(e) != AUTH_NOT_SENT_ERROR:
+          raise
+        self._count_reconnect()
+        continue
+      except Exception:
+        resource_manager.close_transport(transport)
+        raise
+
+      self._count_attempt()
+      resource_manager.close_transport(transport)
+      return True
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        "idle": len(self._idle),
+        "attempts": self._attempts,
+        "handshakes": self._handshakes,
+        "reconnects": self._reconnects,
+        "handshakes_saved": max(0, self._attempts - self._handshakes),
+      }
+
+  def _checkout(self):
+    stale = []
+    transport = None
+
+    with self._lock:
+      while self._idle:
+        candidate, checked_in_at = self._idle.pop()
+        if candidate.is_active() and time.monotonic() - checked_in_at < self.idle_seconds:
+          transport = candidate
+          break
+        stale.append(candidate)
+
+    for candidate in stale:
+      resource_manager.close_transport(candidate)
+
+    if transport is not None:
+      return transport, True
+
+    transport = _connect_transport(self.host, self.port)
+    with self._lock:
+      self._handshakes += 1
+    return transport, False
+
+  def _checkin(self, transport):
+    with self._lock:
+      if len(self._idle) < self.max_transports:
+        self._idle.append((transport, time.monotonic()))
+        return
+
+    resource_manager.close_transport(transport)
+
+  def _count_attempt(self):
+    with self._lock:
+      self._attempts += 1
+
+  def _count_reconnect(self):
+    with self._lock:
+      self._reconnects += 1
+
+def get_login_transports(host: str, port: int) -> LoginTransportSet:
+  with _pools_lock:
+    transports = _login_transports.get((host, port))
+    if transports is None:
+      transports = LoginTransportSet(host, port)
+      _login_transports[(host, port)] = transports
+      stats_reporter.register(f"login_transports {host}:{port}", transports.stats)
+    return transports
+
 class SSHConnector:
   def __init__(self, host: str, port: int = 22):
     self.host = host
     self.port = port
+    self.cwd = "~"
+    self._shell = None
+    self._transport = None
+    self._shell_lock = threading.RLock()
 
   def record_login(self, username: str, password: str):
+    if LOGIN_REUSE_TRANSPORTS:
+      try:
+        if get_login_transports(self.host, self.port).record(username, password):
+          logger.info("Heralding auth succeeded (unexpected)")
+        else:
+          logger.debug("Heralding auth failed (expected)")
+        return
+      except Exception:
+        logger.exception("Login recording error")
+        raise
+
     sock = None
     transport = None
 
@@ -80,301 +400,353 @@ class SSHConnector:
         except Exception:
           logger.exception("Failed to close socket in record_login")
 
-  def replay_history(self, username: str, password: str, history: list[str]):
-    client = None
-    shell = None
-    transport = None
+  def open_shell(self, username: str, password: str):
+    with self._shell_lock:
+      if self.has_shell():
+        return self._shell
 
-    try:
-      client = paramiko.SSHClient()
-      client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-      client.connect(self.host, port=self.port, username=username, password=password, timeout=10)
-      transport = client.get_transport()
+      self._close_shell()
 
-      shell = client.invoke_shell()
-      shell.settimeout(5)
+      shell = None
+      transport = None
 
-      self._wait_for_prompt(shell)
+      try:
+        pool = get_transport_pool(self.host, self.port)
+        if pool is not None:
+          transport = pool.acquire()
+        else:
+          transport = _connect_transport(self.host, self.port)
 
-      output = ""
-      cwd = "~"
+        transport.auth_password(username, password)
 
-      if history:
-        for i, cmd in enumerate(history):
-          shell.send(cmd + "\n")
-          if i == len(history) - 1:
-            output, cwd = self._receive_until_prompt(shell, cmd)
+        shell = transport.open_session(timeout=CONNECT_TIMEOUT)
+        shell.get_pty()
+        shell.invoke_shell()
+        shell.settimeout(5)
 
-      return output, cwd
+        self._wait_for_prompt(shell)
 
-    except Exception:
-      logger.exception("Error in replay_history to %s", self.host)
-      raise
+      except Exception:
+        logger.exception("Error opening backend shell to %s", self.host)
+        resource_manager.close_ssh_connection(shell=shell, transport=transport)
+        raise
+
+      self._transport = transport
+      self._shell = shell
+      self.cwd = "~"
+      logger.debug("Opened persistent backend shell to %s:%s", self.host, self.port)
+      return shell
+
+  def has_shell(self) -> bool:
+    shell = self._shell
+    transport = self._transport
+    if shell is None or transport is None:
+      return False
+    return not shell.closed and transport.is_active()
+
+  def close(self):
+    with self._shell_lock:
+      self._close_shell()
+
+  def abort(self):
+    resource_manager.close_ssh_connection(shell=self._shell, transport=self._transport)
+
+  def _close_shell(self):
+    if self._shell is None and self._transport is None:
+      return
 
+    try:
+      resource_manager.close_ssh_connection(shell=self._shell, transport=self._transport)
     finally:
-      resource_manager.close_ssh_connection(client=client, shell=shell, transport=transport)
-
-  def replay_cwd_only(self, username: str, password: str, history: list[str]) -> str:
-    client = None
-    shell = None
-    transport = None
+      self._shell = None
+      self._transport = None
+      self.cwd = "~"
 
+  def _drain(self, shell):
     try:
-      client = paramiko.SSHClient()
-      client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-      client.connect(self.host, port=self.port, username=username, password=password, timeout=10)
-      transport = client.get_transport()
-
-      shell = client.invoke_shell()
-      shell.settimeout(5)
-
-      self._wait_for_prompt(shell)
-      cwd = "~"
-
-      for cmd in history:
-        if cmd.startswith("cd "):
-          shell.send(cmd + "\n")
-          _, cwd = self._receive_until_prompt(shell, cmd)
-
-      return cwd
-
+      while shell.recv_ready():
+        if not shell.recv(4096):
+          break
     except Exception:
-      logger.exception("Error in replay_cwd_only")
-      raise
+      logger.debug("Failed to drain backend shell", exc_info=True)
 
-    finally:
-      resource_manager.close_ssh_connection(client=client, shell=shell, transport=transport)
+  def replay_history(self, username: str, password: str, history: list[str]):
+    with self._shell_lock:
+      try:
+        started = time.monotonic()
+        self._close_shell()
+        shell = self.open_shell(username, password)
+
+        output = ""
+        cwd = "~"
+
+        if history:
+          shell.sendall("".join(cmd + "\n" for cmd in history))
+          parser = ansi_sequences.TerminalStreamParser(history[-1], user=username)
+          self._recv_last_prompted_output(shell, len(history), parser)
+          output = parser.output()
+          cwd = parser.cwd or "~"
+
+        self.cwd = cwd
+        logger.info(
+          "Replayed %s commands on %s in %.3fs",
+          len(history),
+          self.host,
+          time.monotonic() - started,
+        )
+        return output, cwd
+
+      except Exception:
+        logger.exception("Error in replay_history to %s", self.host)
+        self._close_shell()
+        raise
 
   def execute_command(self, command: str, username: str, password: str, dir_cmd=None):
-    client = None
-    shell = None
-    transport = None
+    with self._shell_lock:
+      try:
+        fresh = not self.has_shell()
+        shell = self.open_shell(username, password)
 
-    try:
-      client = paramiko.SSHClient()
-      client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-      client.connect(self.host, port=self.port, username=username, password=password, timeout=10)
-      transport = client.get_transport()
+        if fresh and dir_cmd:
+          shell.send(dir_cmd + "\n")
+          self._wait_for_prompt(shell)
 
-      shell = client.invoke_shell()
-      shell.settimeout(5)
+        self._drain(shell)
+        shell.send(command + "\n")
+        output, cwd = self._receive_until_prompt(shell, command, user=username)
 
-      self._wait_for_prompt(shell)
+        if cwd:
+          self.cwd = cwd
+        return output, cwd
 
-      if dir_cmd:
-        shell.send(dir_cmd + "\n")
-        self._wait_for_prompt(shell)
+      except Exception:
+        logger.exception("Error in execute_command")
+        self._close_shell()
+        raise
 
-      shell.send(command + "\n")
-      output, cwd = self._receive_until_prompt(shell, command)
+  def execute_with_tab(self, cwd, command: str, username: str, password: str):
+    with self._shell_lock:
+      try:
+        fresh = not self.has_shell()
+        shell = self.open_shell(username, password)
 
-      return output, cwd
+        if fresh or cwd != self.cwd:
+          shell.send(f"cd {cwd}\n")
+          self._wait_for_prompt(shell)
+          self.cwd = cwd
 
-    except Exception:
-      logger.exception("Error in execute_command")
-      raise
+        self._drain(shell)
 
-    finally:
-      resource_manager.close_ssh_connection(client=client, shell=shell, transport=transport)
+        raw_command = command.replace("\t", "")
+        shell.send(raw_command + "\t")
 
-  def execute_with_tab(self, cwd, command: str, username: str, password: str):
-    client = None
-    shell = None
-    transport = None
+        parser = ansi_sequences.TerminalStreamParser()
+        echoed = False
+        deadline = time.monotonic() + TAB_TIMEOUT
 
-    try:
-      client = paramiko.SSHClient()
-      client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-      client.connect(self.host, port=self.port, username=username, password=password, timeout=10)
-      transport = client.get_transport()
+        while True:
+          try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+              break
 
-      shell = client.invoke_shell()
-      shell.settimeout(5)
+            wait = min(remaining, TAB_SETTLE_SECONDS) if echoed else remaining
+            if not self._wait_readable(shell, wait):
+              if echoed:
+                break
+              continue
+
+            chunk = shell.recv(READ_SIZE)
+            if not chunk:
+              break
+            parser.feed(chunk)
+
+            cleaned = parser.tail(len(raw_command) + PROMPT_WINDOW)
+            index = cleaned.rfind(raw_command)
+            if index != -1:
+              echoed = True
+              if len(cleaned) > index + len(raw_command):
+                break
 
-      self._wait_for_prompt(shell)
+          except Exception:
+            logger.exception("Error while receiving TAB completion output")
+            break
 
-      shell.send(f"cd {cwd}\n")
-      self._wait_for_prompt(shell)
+        shell.send(CLEAR_LINE_KEYS + "\n")
+        settled = self._recv_until_prompt(shell, idle_timeout=TAB_TIMEOUT, raise_on_timeout=False)
+        if not settled.prompt_seen:
+          logger.warning("Backend shell did not return to a prompt after TAB probe")
+          self._close_shell()
 
-      raw_command = command.replace("\t", "")
-      shell.send(raw_command + "\t")
-      time.sleep(0.2)
+        return command, parser.text()
 
-      output = b""
-      start_time = time.time()
-      timeout = 1
+      except Exception:
+        logger.exception("Error in execute_with_tab")
+        self._close_shell()
+        return "", ""
 
-      while True:
-        try:
-          if shell.recv_ready():
-            chunk = shell.recv(1024)
-            output += chunk
-            decoded = output.decode("utf-8", errors="ignore")
-            cleaned = ansi_sequences.strip_ansi_sequences(decoded)
-
-            if raw_command in cleaned:
-              index = cleaned.rfind(raw_command)
-              if index != -1 and len(cleaned) > index + len(raw_command):
-                break
+  def execute_exec(self, command: str, username: str, password: str, client_chan) -> int:
+    transport = None
+    backend = None
 
-          if time.time() - start_time > timeout:
-            break
-          time.sleep(0.05)
+    try:
+      pool = get_transport_pool(self.host, self.port)
+      if pool is not None:
+        transport = pool.acquire()
+      else:
+        transport = _connect_transport(self.host, self.port)
 
-        except Exception:
-          logger.exception("Error while receiving TAB completion output")
-          break
+      transport.auth_password(username, password)
 
-      output_chars = output.decode("utf-8", errors="ignore")
+      backend = transport.open_session(timeout=CONNECT_TIMEOUT)
+      backend.exec_command(command)
 
-      return command, output_chars
+      self._stream_exec(backend, client_chan)
+
+      if backend.status_event.wait(EXEC_STATUS_TIMEOUT):
+        return backend.exit_status
+      logger.warning("No exit status from %s for exec, reporting %s", self.host, EXEC_LOST_STATUS)
+      return EXEC_LOST_STATUS
 
     except Exception:
-      logger.exception("Error in execute_with_tab")
-      return "", ""
+      logger.exception("Error in execute_exec")
+      raise
 
     finally:
-      resource_manager.close_ssh_connection(client=client, shell=shell, transport=transport)
+      resource_manager.close_ssh_connection(shell=backend, transport=transport)
 
-  def execute_command_via_shell(self, command: str, username: str, password: str):
-    client = None
-    shell = None
-    transport = None
+  def _stream_exec(self, backend, client_chan):
+    deadline = time.monotonic() + EXEC_TIMEOUT
+    client_eof = False
 
-    try:
-      client = paramiko.SSHClient()
-      client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-      client.connect(self.host, port=self.port, username=username, password=password, timeout=10)
-      transport = client.get_transport()
-
-      shell = client.invoke_shell()
-      shell.settimeout(5)
-
-      initial_output = b""
-      start_time = time.time()
-      while time.time() - start_time < 3:
-        if shell.recv_ready():
-          chunk = shell.recv(4096)
-          initial_output += chunk
-          if b"$ " in chunk or b"# " in chunk:
-            break
-        else:
-          time.sleep(0.05)
+    while True:
+      if backend.recv_ready():
+        data = backend.recv(READ_SIZE)
+        if data:
+          client_chan.sendall(data)
+        continue
+
+      if backend.recv_stderr_ready():
+        data = backend.recv_stderr(READ_SIZE)
+        if data:
+          client_chan.sendall_stderr(data)
+        continue
 
-      shell.send(command + "\n")
-      time.sleep(0.2)
+      if backend.eof_received or backend.closed:
+        self._drain_exec(backend, client_chan)
+        return
 
-      output = b""
-      start_time = time.time()
-      timeout = 5
+      if client_chan.closed:
+        return
 
-      while time.time() - start_time < timeout:
-        if shell.recv_ready():
-          chunk = shell.recv(4096)
-          output += chunk
-          if b"$ " in chunk or b"# " in chunk:
-            break
+      if not client_eof and client_chan.recv_ready():
+        data = client_chan.recv(READ_SIZE)
+        if data:
+          backend.sendall(data)
         else:
-          time.sleep(0.05)
+          client_eof = True
+          backend.shutdown_write()
+        continue
 
-      output_str = output.decode('utf-8', errors='ignore')
+      remaining = deadline - time.monotonic()
+      if remaining <= 0:
+        logger.warning("Exec on %s timed out after %ss", self.host, EXEC_TIMEOUT)
+        return
+
+      watched = [backend] if client_eof else [backend, client_chan]
+      select.select(watched, [], [], remaining)
+
+      if not client_eof and client_chan.eof_received and not client_chan.recv_ready():
+        client_eof = True
+        backend.shutdown_write()
+
+  def _drain_exec(self, backend, client_chan):
+    while backend.recv_ready() or backend.recv_stderr_ready():
+      if backend.recv_ready():
+        data = backend.recv(READ_SIZE)
+        if data:
+          client_chan.sendall(data)
+      if backend.recv_stderr_ready():
+        data = backend.recv_stderr(READ_SIZE)
+        if data:
+          client_chan.sendall_stderr(data)
+
+  def _wait_readable(self, shell, timeout: float) -> bool:
+    if shell.recv_ready() or shell.closed:
+      return True
+    ready, _, _ = select.select([shell], [], [], max(0.0, timeout))
+    return bool(ready)
+
+  def _recv_until_prompt(self, shell, parser=None, idle_timeout: float = SHELL_TIMEOUT, deadline: float = None, raise_on_timeout: bool = True):
+    if parser is None:
+      parser = ansi_sequences.TerminalStreamParser()
 
-      output_str = ansi_sequences.strip_ansi_sequences(output_str)
+    while True:
+      timeout = idle_timeout
+      if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
 
-      lines = output_str.split('\n')
-      cleaned_lines = []
+      if timeout <= 0 or not self._wait_readable(shell, timeout):
+        if raise_on_timeout:
+          raise sock_module.timeout("Timed out waiting for backend prompt")
+        break
 
-      for line in lines:
-        stripped = line.strip()
+      data = shell.recv(READ_SIZE)
+      if not data:
+        break
+
+      parser.feed(data)
+      if parser.prompt_seen:
+        break
 
-        if not stripped:
-          continue
+    return parser
 
-        if stripped == command or stripped.startswith(command + ' ') or stripped.endswith(command):
-          continue
+  def _recv_last_prompted_output(self, shell, prompts: int, parser, idle_timeout: float = SHELL_TIMEOUT):
+    output = bytearray()
+    skip = prompts - 1
+    seen = 0
 
-        if re.match(r'^[^@]+@[^:]+:[^$#]*[\$#]\s*$', stripped):
-          continue
+    while seen < skip:
+      if not self._wait_readable(shell, idle_timeout):
+        raise sock_module.timeout("Timed out waiting for replayed prompts")
 
-        prompt_match = re.search(r'^(.+?)\s+[^@]+@[^:]+:[^$#]*[\$#]\s*$', line)
-        if prompt_match:
-          output_content = prompt_match.group(1).strip()
-          if output_content:
-            cleaned_lines.append(output_content)
-          continue
+      data = shell.recv(READ_SIZE)
+      if not data:
+        return parser
 
-        cleaned_lines.append(line.rstrip())
+      output += data
 
-      if cleaned_lines:
-        result = '\n'.join(cleaned_lines)
-        if not result.endswith('\n'):
-          result += '\n'
-      else:
-        result = ''
+      while seen < skip:
+        match = PROMPT_SCAN_RE.search(output)
+        if not match:
+          break
+        seen += 1
+        del output[:match.end()]
 
-      return result
+      if seen < skip and len(output) > PROMPT_WINDOW:
+        del output[:len(output) - PROMPT_WINDOW]
 
-    except Exception:
-      logger.exception("Error in execute_command_via_shell")
-      raise
+    parser.feed(bytes(output))
+    if parser.prompt_seen:
+      return parser
 
-    finally:
-      resource_manager.close_ssh_connection(client=client, shell=shell, transport=transport)
+    return self._recv_until_prompt(shell, parser, idle_timeout=idle_timeout)
 
   def _wait_for_prompt(self, shell):
     try:
-      while True:
-        data = shell.recv(1024)
-
-        if not data:
-          break
-
-        if b"$ " in data or b"# " in data:
-          break
+      self._recv_until_prompt(shell)
 
     except Exception:
       logger.exception("Error in _wait_for_prompt")
       raise
 
-  def _receive_until_prompt(self, shell, sent_cmd: str = "") -> tuple[str, str]:
-    output = b""
-    prompt_line = b""
+  def _receive_until_prompt(self, shell, sent_cmd: str = "", user: str = None) -> tuple[str, str]:
+    parser = ansi_sequences.TerminalStreamParser(sent_cmd, user=user)
 
     try:
-      while True:
-        data = shell.recv(1024)
-        if not data:
-          break
-        output += data
-        if b"$ " in data or b"# " in data:
-          prompt_line = data
-          break
+      self._recv_until_prompt(shell, parser)
     except Exception:
       logger.exception("Error in _receive_until_prompt")
       raise
 
-    lines = output.split(b"\n")
-    cleaned_lines = []
-
-    for i, line in enumerate(lines):
-      if sent_cmd.encode("utf-8") in line.strip():
-        continue
-      if i == len(lines) - 1:
-        try:
-          line_str = line.decode("utf-8", errors="ignore")
-          prompt_str = prompt_line.decode("utf-8", errors="ignore").strip()
-          cleaned_line_str = ansi_sequences.remove_prompt(line_str)
-          cleaned_lines.append(cleaned_line_str.encode("utf-8"))
-        except Exception:
-          cleaned_lines.append(line)
-      else:
-        cleaned_lines.append(line)
-
-    output_lines = b"\n".join(cleaned_lines).decode("utf-8", errors="ignore")
-
-    cwd = "~"
-    match = re.search(r"@[^:]+:(.*?)[\$#] ?", prompt_str)
-    if match:
-      cwd = match.group(1).strip()
-
-    return output_lines, cwd
+    return parser.output(), parser.cwd
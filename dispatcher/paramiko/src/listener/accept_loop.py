@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from utils import resource_manager, stats_reporter
+import logging
+import os
+import selectors
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+MAX_PREAUTH_CONNECTIONS = int(os.getenv("SSH_MAX_PREAUTH_CONNECTIONS", "256"))
+LISTEN_BACKLOG = 100
+
+class AcceptLoop:
+  def __init__(self, host: str, port: int, handle_client, max_preauth: int = MAX_PREAUTH_CONNECTIONS):
+    self.host = host
+    self.port = port
+    self.handle_client = handle_client
+    self.max_preauth = max(1, max_preauth)
+    self._selector = selectors.DefaultSelector()
+    self._executor = ThreadPoolExecutor(max_workers=self.max_preauth, thread_name_prefix="ssh-handshake")
+    self._preauth_slots = threading.BoundedSemaphore(self.max_preauth)
+    self._stats_lock = threading.Lock()
+    self._accepted = 0
+    self._rejected = 0
+    self._preauth = 0
+    stats_reporter.register(f"accept_loop {host}:{port}", self.stats)
+
+  def stats(self) -> dict:
+    with self._stats_lock:
+      return {
+        "accepted": self._accepted,
+        "rejected": self._rejected,
+        "preauth": self._preauth,
+        "max_preauth": self.max_preauth,
+      }
+
+  def serve_forever(self) -> None:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    try:
+      sock.bind((self.host, self.port))
+      sock.listen(LISTEN_BACKLOG)
+      sock.setblocking(False)
+      self._selector.register(sock, selectors.EVENT_READ)
+      logger.info(
+        "SSH Proxy listening on %s:%s (max_preauth=%s)",
+        self.host,
+        self.port,
+        self.max_preauth,
+      )
+
+      while True:
+        for key, _ in self._selector.select(timeout=1.0):
+          self._accept_pending(key.fileobj)
+
+    except Exception:
+      logger.exception("Fatal error in accept loop")
+
+    finally:
+      try:
+        self._selector.unregister(sock)
+      except Exception:
+        pass
+      self._selector.close()
+      resource_manager.close_socket(sock)
+      self._executor.shutdown(wait=False)
+
+  def _accept_pending(self, sock) -> None:
+    while True:
+      try:
+        client, addr = sock.accept()
+      except (BlockingIOError, InterruptedError):
+        return
+      except Exception:
+        logger.exception("Socket accept failed")
+        return
+
+      client.setblocking(True)
+
+      if not self._preauth_slots.acquire(blocking=False):
+        with self._stats_lock:
+          self._rejected += 1
+        logger.debug("Pre-auth limit reached (%s), dropping %s", self.max_preauth, addr)
+        resource_manager.close_socket(client)
+        continue
+
+      with self._stats_lock:
+        self._accepted += 1
+        self._preauth += 1
+
+      try:
+        self._executor.submit(self._run_handshake, client, addr)
+      except Exception:
+        logger.exception("Failed to schedule handshake for %s", addr)
+        self._release_slot()
+        resource_manager.close_socket(client)
+
+  def _run_handshake(self, client, addr) -> None:
+    try:
+      self.handle_client(client, addr)
+    except Exception:
+      logger.exception("Unhandled error in handshake worker")
+    finally:
+      self._release_slot()
+
+  def _release_slot(self) -> None:
+    with self._stats_lock:
+      self._preauth -= 1
+    self._preauth_slots.release()
@@ -1,14 +1,14 @@
 from mode.mode_manager import ModeManager
 from auth import auth_user
-from connector import connect_server
+from connector import connect_server, login_mirror
 from session import handler
 from utils import log_event, resource_manager
+from listener import accept_loop
+from notifier import launcher_client
 import logging
-import socket
 import threading
 import paramiko
 import time
-import requests
 import sys
 
 logging.basicConfig(
@@ -25,13 +25,14 @@ HOST_KEY = paramiko.RSAKey(filename="/certs/ssh_host_rsa_key")
 COWRIE_VERSION = None
 
 mode_manager = ModeManager()
+credential_mirror = login_mirror.LoginMirror()
 
 class SSHProxyServer(paramiko.ServerInterface):
   def __init__(self, client_addr):
     self.event = threading.Event()
     self.username = None
     self.password = None
-    self.authenticator = auth_user.Authenticator()
+    self.authenticator = auth_user.get_authenticator()
     self.client_addr = client_addr
     self.cowrie_launched = False
     self.heralding_connector = connect_server.SSHConnector(host="heralding")
@@ -46,15 +47,9 @@ class SSHProxyServer(paramiko.ServerInterface):
     self.password = password
 
     if self.mode == "tsubomi":
-      try:
-        self.cowrie_connector.record_login(username=username, password=password)
-      except Exception:
-        logger.exception("Failed to record login via cowrie_connector (tsubomi mode)")
+      credential_mirror.submit(self.cowrie_connector, username, password)
     else:
-      try:
-        self.heralding_connector.record_login(username=username, password=password)
-      except Exception:
-        logger.exception("Failed to record login via heralding_connector")
+      credential_mirror.submit(self.heralding_connector, username, password)
 
     auth_success = self.authenticator.authenticate(username, password)
     log_event.log_auth_event(self.client_addr, HOST, PORT, username, password, auth_success, self.mode)
@@ -98,32 +93,23 @@ class SSHProxyServer(paramiko.ServerInterface):
       log_event.log_command_event(src_ip, src_port, self.username, command_str, "~", self.mode)
 
       if not self.cowrie_launched:
-        try:
-          res = requests.post("http://launcher:5000/trigger/cowrie", timeout=5)
-          if res.status_code == 200:
-            logger.info("Cowrie started for exec request")
-            self.cowrie_launched = True
-          else:
-            logger.error("Failed to start cowrie at exec request (HTTP %s)", res.status_code)
-            channel.send(b"Service unavailable.\n")
-            channel.send_exit_status(1)
-            resource_manager.close_channel(channel)
-            return
-        except Exception:
-          logger.exception("Error triggering cowrie at exec request")
+        if launcher_client.get_client().trigger("cowrie"):
+          logger.info("Cowrie started for exec request")
+          self.cowrie_launched = True
+        else:
+          logger.error("Failed to start cowrie at exec request")
           channel.send(b"Service unavailable.\n")
           channel.send_exit_status(1)
-          resource_manager.close_channel(channel)
           return
 
       try:
-        output = self.cowrie_connector.execute_command_via_shell(
+        exit_status = self.cowrie_connector.execute_exec(
           command_str,
           self.username,
-          self.password
+          self.password,
+          channel
         )
-        channel.send(output.encode('utf-8'))
-        channel.send_exit_status(0)
+        channel.send_exit_status(exit_status)
       except Exception:
         logger.exception("Failed to execute command on cowrie")
         channel.send(b"Command execution failed.\n")
@@ -133,7 +119,7 @@ class SSHProxyServer(paramiko.ServerInterface):
       logger.exception("Error in _handle_exec_request")
       channel.send_exit_status(1)
     finally:
-      resource_manager.close_channel(channel)
+      resource_manager.close_channel(channel, send_status=False)
 
   def _trigger_cowrie(self):
     if self.mode == "yozakura":
@@ -146,15 +132,11 @@ class SSHProxyServer(paramiko.ServerInterface):
       self.cowrie_launched = True
       return
 
-    try:
-      res = requests.post("http://launcher:5000/trigger/cowrie", timeout=5)
-      if res.status_code == 200:
-        logger.info("Cowrie started in auth stage (sakura mode)")
-        self.cowrie_launched = True
-      else:
-        logger.error("Failed to start cowrie at auth (HTTP %s)", res.status_code)
-    except Exception:
-      logger.exception("Error triggering cowrie at auth")
+    if launcher_client.get_client().trigger("cowrie"):
+      logger.info("Cowrie started in auth stage (sakura mode)")
+      self.cowrie_launched = True
+    else:
+      logger.error("Failed to start cowrie at auth")
 
 def _handle_client(client, addr):
   transport = None
@@ -231,28 +213,10 @@ def start_proxy():
   COWRIE_VERSION = connect_server.fetch_server_version("cowrie", 2222)
   logger.info("Using SSH version string: %s", COWRIE_VERSION)
 
-  sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-  sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-  sock.bind((HOST, PORT))
-  sock.listen(100)
-  logger.info("SSH Proxy listening on %s:%s", HOST, PORT)
+  connect_server.start_transport_pool("cowrie", 2222, server_version=COWRIE_VERSION)
 
-  try:
-    while True:
-      try:
-        client, addr = sock.accept()
-      except Exception:
-        logger.exception("Socket accept failed")
-        continue
-
-      threading.Thread(target=_handle_client, args=(client, addr), daemon=True).start()
-  except Exception:
-    logger.exception("Fatal error in accept loop")
-  finally:
-    try:
-      sock.close()
-    except Exception:
-      logger.exception("Failed to close listening socket")
+  loop = accept_loop.AcceptLoop(HOST, PORT, _handle_client)
+  loop.serve_forever()
 
 if __name__ == "__main__":
   sys.path.insert(0, '/app')
@@ -1,10 +1,18 @@
+from notifier import launcher_client
+from collections import namedtuple
 import logging
+import os
 import threading
 import time
-import requests
 
 logger = logging.getLogger(__name__)
 
+WATCH_TIMEOUT = float(os.getenv("MODE_WATCH_TIMEOUT", "25"))
+WATCH_MAX_BACKOFF = 10.0
+POLL_INTERVAL = 10
+
+ModeSnapshot = namedtuple("ModeSnapshot", ["mode", "version"])
+
 class ModeManager:
   _instance = None
   _lock = threading.Lock()
@@ -23,57 +31,73 @@ class ModeManager:
 
     self._initialized = True
     self._mode_lock = threading.Lock()
-    self._current_mode = "sakura"
-    logger.info("ModeManager initialized with mode: %s", self._current_mode)
+    self._snapshot = ModeSnapshot("sakura", 0)
+    self._watch_healthy = False
+    logger.info("ModeManager initialized with mode: %s", self._snapshot.mode)
 
     self._start_sync_thread()
 
   def _fetch_current_mode(self) -> str:
     try:
-      response = requests.get("http://launcher:5000/current-mode", timeout=2)
-      if response.status_code == 200:
-        mode = response.text.strip()
-        return mode
-      else:
-        logger.warning("Failed to fetch mode from launcher: HTTP %s", response.status_code)
-    except requests.exceptions.RequestException as e:
-      logger.debug("Mode fetch error (will retry): %s", e)
+      return launcher_client.get_client().current_mode()
     except Exception as e:
-      logger.exception("Unexpected error fetching mode: %s", e)
+      logger.debug("Mode fetch error (will retry): %s", e)
     return None
 
+  def _apply(self, mode: str, version: int = None, source: str = "mode-sync"):
+    with self._mode_lock:
+      old = self._snapshot
+      if version is None:
+        version = old.version
+      if old.mode == mode and old.version == version:
+        return
+      self._snapshot = ModeSnapshot(mode, version)
+
+    if old.mode != mode:
+      logger.info("[%s] %s -> %s (version %s)", source, old.mode, mode, version)
+
+  def _watch_mode(self):
+    backoff = 1.0
+
+    while True:
+      try:
+        data = launcher_client.get_client().watch_mode(self._snapshot.version, WATCH_TIMEOUT)
+        self._apply(data["mode"], int(data["version"]), source="mode-watch")
+        self._watch_healthy = True
+        backoff = 1.0
+      except Exception as e:
+        if self._watch_healthy:
+          logger.warning("Mode watch failed, falling back to polling: %s", e)
+        else:
+          logger.debug("Mode watch error (will retry): %s", e)
+        self._watch_healthy = False
+        time.sleep(backoff)
+        backoff = min(backoff * 2, WATCH_MAX_BACKOFF)
+
   def _sync_mode(self):
     while True:
       try:
-        time.sleep(10)
+        time.sleep(POLL_INTERVAL)
+        if self._watch_healthy:
+          continue
         new_mode = self._fetch_current_mode()
         if new_mode:
-          with self._mode_lock:
-            if self._current_mode != new_mode:
-              old_mode = self._current_mode
-              self._current_mode = new_mode
-              logger.info("[mode-sync] %s -> %s", old_mode, new_mode)
+          self._apply(new_mode)
       except Exception as e:
         logger.exception("Error in mode sync thread: %s", e)
 
   def _start_sync_thread(self):
+    watch_thread = threading.Thread(target=self._watch_mode, daemon=True)
+    watch_thread.start()
+
     sync_thread = threading.Thread(target=self._sync_mode, daemon=True)
     sync_thread.start()
 
-    init_thread = threading.Thread(target=self._initial_fetch, daemon=True)
-    init_thread.start()
-
-  def _initial_fetch(self):
-    time.sleep(1)
-    initial_mode = self._fetch_current_mode()
-    if initial_mode:
-      with self._mode_lock:
-        self._current_mode = initial_mode
-        logger.info("[mode-init] mode=%s", initial_mode)
-
   def get_mode(self) -> str:
-    with self._mode_lock:
-      return self._current_mode
+    return self._snapshot.mode
+
+  def get_snapshot(self) -> ModeSnapshot:
+    return self._snapshot
 
   def set_mode(self, mode: str) -> None:
     valid_modes = ["sakura", "yozakura", "tsubomi"]
@@ -82,9 +106,9 @@ class ModeManager:
       raise ValueError(f"Invalid mode: {mode}")
 
     with self._mode_lock:
-      old_mode = self._current_mode
-      self._current_mode = mode
-      logger.info("Mode changed: %s -> %s", old_mode, mode)
+      old = self._snapshot
+      self._snapshot = ModeSnapshot(mode, old.version)
+      logger.info("Mode changed: %s -> %s", old.mode, mode)
 
   def is_sakura(self) -> bool:
     return self.get_mode() == "sakura"
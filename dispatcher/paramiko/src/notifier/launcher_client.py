@@ -1,12 +1,186 @@
+from requests.adapters import HTTPAdapter
+from utils import stats_reporter
+import bisect
 import logging
+import os
+import random
+import threading
+import time
 import requests
 
 logger = logging.getLogger(__name__)
 
+LAUNCHER_URL = os.getenv("LAUNCHER_URL", "http://launcher:5000")
+POOL_SIZE = int(os.getenv("LAUNCHER_POOL_SIZE", "16"))
+MAX_RETRIES = int(os.getenv("LAUNCHER_MAX_RETRIES", "2"))
+RETRY_BASE_DELAY = 0.2
+RETRY_STATUSES = (502, 503, 504)
+TIMEOUTS = {
+  "trigger": 5,
+  "session": 2,
+  "mode": 2,
+}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class LatencyHistogram:
+  def __init__(self, buckets=LATENCY_BUCKETS):
+    self.buckets = buckets
+    self._lock = threading.Lock()
+    self._counts = [0] * (len(buckets) + 1)
+    self._sum = 0.0
+    self._errors = 0
+
+  def observe(self, seconds: float, error: bool = False):
+    with self._lock:
+      self._counts[bisect.bisect_left(self.buckets, seconds)] += 1
+      self._sum += seconds
+      if error:
+        self._errors += 1
+
+  def snapshot(self) -> dict:
+    with self._lock:
+      counts = list(self._counts)
+      total = sum(counts)
+      return {
+        "count": total,
+        "errors": self._errors,
+        "sum": round(self._sum, 6),
+        "buckets": {str(le): n for le, n in zip(self.buckets + ("+Inf",), counts)},
+      }
+
+class _Flight:
+  def __init__(self):
+    self.done = threading.Event()
+    self.result = False
+
+class LauncherClient:
+  def __init__(self, base_url: str = LAUNCHER_URL, pool_size: int = POOL_SIZE, max_retries: int = MAX_RETRIES):
+    self.base_url = base_url.rstrip("/")
+    self.max_retries = max_retries
+    self._session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    self._session.mount("http://", adapter)
+    self._session.mount("https://", adapter)
+    self._histograms = {}
+    self._histograms_lock = threading.Lock()
+    self._flights = {}
+    self._flights_lock = threading.Lock()
+    self._coalesced = 0
+
+  def request(self, method: str, path: str, endpoint: str, timeout: float = None, retries: int = None, **kwargs):
+    if timeout is None:
+      timeout = TIMEOUTS.get(endpoint, 5)
+    if retries is None:
+      retries = self.max_retries
+
+    histogram = self._histogram(endpoint)
+    attempt = 0
+
+    while True:
+      started = time.monotonic()
+      try:
+        response = self._session.request(method, f"{self.base_url}{path}", timeout=timeout, **kwargs)
+      except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        histogram.observe(time.monotonic() - started, error=True)
+        if attempt >= retries:
+          raise
+      else:
+        retryable = response.status_code in RETRY_STATUSES
+        histogram.observe(time.monotonic() - started, error=response.status_code >= 400)
+        if not retryable or attempt >= retries:
+          return response
+
+      attempt += 1
+      time.sleep(random.uniform(0, RETRY_BASE_DELAY * (2 ** attempt)))
+
+  def trigger(self, service: str = "cowrie") -> bool:
+    with self._flights_lock:
+      flight = self._flights.get(service)
+      leader = flight is None
+      if leader:
+        flight = _Flight()
+        self._flights[service] = flight
+      else:
+        self._coalesced += 1
+
+    if not leader:
+      flight.done.wait()
+      return flight.result
+
+    try:
+      response = self.request("POST", f"/trigger/{service}", "trigger")
+      flight.result = response.status_code == 200
+      if not flight.result:
+        logger.error("Failed to trigger %s (HTTP %s)", service, response.status_code)
+    except Exception:
+      logger.exception("Error triggering %s", service)
+      flight.result = False
+    finally:
+      with self._flights_lock:
+        self._flights.pop(service, None)
+      flight.done.set()
+
+    return flight.result
+
+  def update_session(self, service: str = "cowrie", payload: dict = None) -> bool:
+    try:
+      response = self.request("POST", f"/session/update/{service}", "session", json=payload)
+      return response.status_code == 200
+    except Exception:
+      logger.exception("Session update failed")
+      return False
+
+  def current_mode(self) -> str:
+    response = self.request("GET", "/current-mode", "mode")
+    if response.status_code != 200:
+      logger.warning("Failed to fetch mode from launcher: HTTP %s", response.status_code)
+      return None
+    return response.text.strip()
+
+  def watch_mode(self, version: int, timeout: float) -> dict:
+    response = self.request(
+      "GET",
+      "/mode/watch",
+      "mode_watch",
+      timeout=timeout + 5,
+      retries=0,
+      params={"version": version, "timeout": timeout},
+    )
+    if response.status_code != 200:
+      raise requests.exceptions.RequestException(f"HTTP {response.status_code}")
+    return response.json()
+
+  def stats(self) -> dict:
+    with self._histograms_lock:
+      histograms = dict(self._histograms)
+    with self._flights_lock:
+      coalesced = self._coalesced
+      inflight = len(self._flights)
+
+    return {
+      "coalesced_triggers": coalesced,
+      "inflight_triggers": inflight,
+      "latency": {name: h.snapshot() for name, h in histograms.items()},
+    }
+
+  def _histogram(self, endpoint: str) -> LatencyHistogram:
+    with self._histograms_lock:
+      histogram = self._histograms.get(endpoint)
+      if histogram is None:
+        histogram = self._histograms[endpoint] = LatencyHistogram()
+      return histogram
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> LauncherClient:
+  global _client
+  if _client is None:
+    with _client_lock:
+      if _client is None:
+        _client = LauncherClient()
+        stats_reporter.register("launcher_client", _client.stats)
+  return _client
+
 def notify_launcher():
-  try:
-    response = requests.post("http://launcher:5000/trigger/cowrie")
-    return response.status_code == 200
-  except Exception:
-    logger.exception("Failed to notify launcher")
-    return False
+  return get_client().trigger("cowrie")
@@ -0,0 +1,77 @@
+import collections
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = 512
+
+MUTATING_COMMANDS = {
+  "busybox", "chmod", "chown", "cp", "curl", "dd", "ftpget", "git", "gunzip",
+  "gzip", "install", "ln", "mkdir", "mv", "rm", "rmdir", "scp", "tar", "tee",
+  "tftp", "touch", "unzip", "wget",
+}
+
+SEGMENT_SPLIT_RE = re.compile(r"\s*(?:;|&&|\|\||\|)\s*")
+REDIRECT_RE = re.compile(r"(?<![<>&\d])\d*>{1,2}(?!&)")
+
+def is_mutating(command: str) -> bool:
+  if REDIRECT_RE.search(command):
+    return True
+
+  for segment in SEGMENT_SPLIT_RE.split(command.strip()):
+    words = segment.split()
+    while words and words[0] in ("sudo", "nohup", "env"):
+      words = words[1:]
+    if words and words[0].rsplit("/", 1)[-1] in MUTATING_COMMANDS:
+      return True
+
+  return False
+
+class CompletionCache:
+  def __init__(self, max_entries: int = MAX_ENTRIES):
+    self.max_entries = max_entries
+    self._entries = collections.OrderedDict()
+    self._lock = threading.Lock()
+    self._hits = 0
+    self._misses = 0
+    self._invalidations = 0
+
+  def get(self, cwd: str, prefix: str):
+    key = (cwd, prefix)
+    with self._lock:
+      if key in self._entries:
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return self._entries[key]
+      self._misses += 1
+      return None
+
+  def put(self, cwd: str, prefix: str, completion: str):
+    key = (cwd, prefix)
+    with self._lock:
+      self._entries[key] = completion
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def invalidate(self):
+    with self._lock:
+      if self._entries:
+        self._entries.clear()
+        self._invalidations += 1
+
+  def invalidate_for(self, command: str):
+    if is_mutating(command):
+      logger.debug("Invalidating completion cache after: %s", command)
+      self.invalidate()
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        "entries": len(self._entries),
+        "hits": self._hits,
+        "misses": self._misses,
+        "invalidations": self._invalidations,
+      }
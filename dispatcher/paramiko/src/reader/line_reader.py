@@ -1,11 +1,17 @@
 from connector import connect_server
-from utils import ansi_sequences, extract_chars
+from reader import completion_cache
+from session import cwd_tracker
+from utils import extract_chars
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+READ_SIZE = 4096
+PRINTABLE_RUN_RE = re.compile(rb"[^\x00-\x1f\x7f]+")
+
 class LineReader:
-  def __init__(self, chan, username, password, prompt="", history=[], cowrie_connector: connect_server.SSHConnector = None):
+  def __init__(self, chan, username, password, prompt="", history=[], cowrie_connector: connect_server.SSHConnector = None, cwd_state: cwd_tracker.CwdTracker = None, on_input=None):
     self.chan = chan
     self.username = username
     self.password = password
@@ -18,28 +24,51 @@ class LineReader:
     self.history_index = -1
     self.max_history_length = 1000
     self.cowrie_connector = cowrie_connector
+    self.cwd_state = cwd_state or cwd_tracker.CwdTracker()
+    self.completion_cache = completion_cache.CompletionCache()
+    self._pending = bytearray()
+    self._out = bytearray()
+    self.on_input = on_input
+    self._output_gate = None
 
   def update_prompt(self, new_prompt):
     self.prompt = new_prompt
 
+  def _write(self, data: bytes):
+    self._out += data
+
+  def hold_output_until(self, event):
+    self._output_gate = event
+
+  def _flush(self):
+    if not self._out:
+      return
+    if self._output_gate is not None:
+      self._output_gate.wait()
+      self._output_gate = None
+    try:
+      self.chan.sendall(bytes(self._out))
+    finally:
+      self._out.clear()
+
   def send_prompt(self):
-    self.chan.send(self.prompt.encode("utf-8"))
+    self._write(self.prompt.encode("utf-8"))
 
   def redraw_buffer(self):
-    self.chan.send(b"\r")
+    self._write(b"\r")
     self.send_prompt()
 
     rendered = (b"".join(self.buffer))
-    self.chan.send(rendered)
+    self._write(rendered)
 
     if self.prev_rendered_len > len(self.buffer):
       diff = self.prev_rendered_len - len(self.buffer)
-      self.chan.send(b" " * diff)
-      self.chan.send(f"\x1b[{diff}D".encode())
+      self._write(b" " * diff)
+      self._write(f"\x1b[{diff}D".encode())
 
     back = len(rendered) - self.cursor_pos
     if back > 0:
-      self.chan.send(f"\x1b[{back}D".encode())
+      self._write(f"\x1b[{back}D".encode())
 
     self.prev_rendered_len = len(rendered)
 
@@ -63,22 +92,23 @@ class LineReader:
     command_with_tab = full_input + "\t"
 
     connector = self.cowrie_connector or connect_server.SSHConnector(host="cowrie", port=2222)
-    cwd = connector.replay_cwd_only(
-      username=self.username,
-      password=self.password,
-      history=self.history
-    )
-
-    command, output_chars = connector.execute_with_tab(
-      cwd,
-      command_with_tab,
-      self.username,
-      self.password
-    )
-
-    output_chars_clean = ansi_sequences.strip_ansi_sequences(output_chars)
-    completed_command = extract_chars.get_completion_diff(command.strip(), output_chars_clean.strip())
-    completion_diff = completed_command[len(command.strip()):]
+    cwd = self.cwd_state.cwd
+
+    completion_diff = self.completion_cache.get(cwd, full_input)
+
+    if completion_diff is None:
+      command, output_chars = connector.execute_with_tab(
+        cwd,
+        command_with_tab,
+        self.username,
+        self.password
+      )
+
+      completed_command = extract_chars.get_completion_diff(command.strip(), output_chars.strip())
+      completion_diff = completed_command[len(command.strip()):]
+
+      if command:
+        self.completion_cache.put(cwd, full_input, completion_diff)
 
     if completion_diff:
       buffer_str = b''.join(self.buffer).decode("utf-8", errors="ignore")
@@ -93,13 +123,7 @@ class LineReader:
 
         self.redraw_buffer()
 
-  def handle_escape_sequence(self):
-    try:
-      seq = self.chan.recv(2)
-    except Exception:
-      logger.exception("Failed to read escape sequence")
-      return
-
+  def handle_escape_sequence(self, seq: bytes):
     # UP
     if seq == b"[A":
       if self.history:
@@ -120,56 +144,77 @@ class LineReader:
     elif seq == b"[C":
       if self.cursor_pos < len(self.buffer):
         self.cursor_pos += 1
-        self.chan.send(b"\x1b[C")
+        self._write(b"\x1b[C")
 
     # LEFT
     elif seq == b"[D":
       if self.cursor_pos > 0:
         self.cursor_pos -= 1
-        self.chan.send(b"\x1b[D")
+        self._write(b"\x1b[D")
 
     # DELETE
-    elif seq == b"[3":
-      try:
-        t = self.chan.recv(1)
-        if t == b"~" and self.cursor_pos < len(self.buffer):
-          del self.buffer[self.cursor_pos]
-          if self.cursor_pos == len(self.buffer):
-            self.chan.send(b" \b")
-          else:
-            remainder = b"".join(self.buffer[self.cursor_pos:]) + b" "
-            self.chan.send(remainder)
-            self.chan.send(f"\x1b[{len(remainder)}D".encode())
-      except Exception:
-        logger.exception("Failed to read DELETE escape sequence")
-        return
-
-  def read(self):
-    self.buffer = []
-    self.cursor_pos = 0
-    self.history_index = -1
-    self.chan.send(b"\r\x1b[2K")
-    self.send_prompt()
+    elif seq == b"[3~":
+      if self.cursor_pos < len(self.buffer):
+        del self.buffer[self.cursor_pos]
+        if self.cursor_pos == len(self.buffer):
+          self._write(b" \b")
+        else:
+          remainder = b"".join(self.buffer[self.cursor_pos:]) + b" "
+          self._write(remainder)
+          self._write(f"\x1b[{len(remainder)}D".encode())
+
+  def _escape_complete(self) -> bool:
+    seq = self.escape_seq
+    if len(seq) < 3:
+      return False
+    if seq[1:3] == b"[3":
+      return len(seq) >= 4
+    return True
+
+  def _finish_line(self) -> str:
+    self._write(b"\r\n")
+    line = b"".join(self.buffer).decode("utf-8", errors="ignore")
+    if line:
+      self.history.append(line)
+      if len(self.history) > self.max_history_length:
+        self.history.pop(0)
+    return line
+
+  def _feed(self):
+    index = 0
+    pending = self._pending
 
-    while True:
-      try:
-        data = self.chan.recv(1)
-        if not data:
-          break
+    try:
+      while index < len(pending):
+        if not self.escape_seq and self.cursor_pos == len(self.buffer):
+          run = PRINTABLE_RUN_RE.match(pending, index)
+          if run:
+            chars = bytes(run.group())
+            self.buffer.extend(chars[i:i + 1] for i in range(len(chars)))
+            self.cursor_pos = len(self.buffer)
+            self._write(chars)
+            index = run.end()
+            continue
+
+        data = bytes(pending[index:index + 1])
+        index += 1
+
+        if self.escape_seq:
+          self.escape_seq += data
+          if self._escape_complete():
+            seq = self.escape_seq[1:]
+            self.escape_seq = b""
+            if seq[:2] != b"[3" or seq == b"[3~":
+              self.handle_escape_sequence(seq)
+          continue
 
         if data == b"\x1b":
-          self.handle_escape_sequence()
+          self.escape_seq = data
           continue
 
         # ENTER
         if data in (b"\n", b"\r"):
-          self.chan.send(b"\r\n")
-          line = b"".join(self.buffer).decode("utf-8", errors="ignore")
-          if line:
-            self.history.append(line)
-            if len(self.history) > self.max_history_length:
-              self.history.pop(0)
-          return line
+          return self._finish_line()
 
         # BACKSPACE
         if data in (b"\x7f", b"\x08"):
@@ -177,15 +222,16 @@ class LineReader:
             del self.buffer[self.cursor_pos - 1]
             self.cursor_pos -= 1
             if self.cursor_pos == len(self.buffer):
-              self.chan.send(b"\b \b")
+              self._write(b"\b \b")
             else:
               remainder = b"".join(self.buffer[self.cursor_pos:]) + b" "
-              self.chan.send(b"\b" + remainder)
-              self.chan.send(f"\x1b[{len(remainder)}D".encode())
+              self._write(b"\b" + remainder)
+              self._write(f"\x1b[{len(remainder)}D".encode())
           continue
 
         # TAB
         if data == b"\t":
+          self._flush()
           self.handle_tab_completion()
           continue
 
@@ -193,17 +239,49 @@ class LineReader:
         self.cursor_pos += 1
 
         if self.cursor_pos == len(self.buffer):
-          self.chan.send(data)
+          self._write(data)
         else:
           remainder = b"".join(self.buffer[self.cursor_pos - 1:])
-          self.chan.send(remainder)
-          self.chan.send(f"\x1b[{len(remainder) - 1}D".encode())
+          self._write(remainder)
+          self._write(f"\x1b[{len(remainder) - 1}D".encode())
+
+      return None
+
+    finally:
+      del pending[:index]
+
+  def read(self):
+    self.buffer = []
+    self.cursor_pos = 0
+    self.history_index = -1
+    self._write(b"\r\x1b[2K")
+    self.send_prompt()
+
+    while True:
+      if not self._pending:
+        self._flush()
+        try:
+          data = self.chan.recv(READ_SIZE)
+        except Exception as e:
+          raise EOFError("channel read failed") from e
+        if not data:
+          raise EOFError("channel closed")
+        self._pending += data
+        if self.on_input is not None:
+          self.on_input()
+
+      try:
+        line = self._feed()
+        self._flush()
+        if line is not None:
+          return line
 
       except Exception:
         logger.exception("Error while reading from channel")
-        break
-
-    return ""
+        self._pending.clear()
+        self.escape_seq = b""
+        return ""
 
   def cleanup_terminal(self):
+    self._out.clear()
     self.chan.send(b"\x1b[0m")
@@ -0,0 +1,45 @@
+import posixpath
+import threading
+
+class CwdTracker:
+  def __init__(self, cwd: str = "~"):
+    self._cwd = cwd
+    self._stack = []
+    self._lock = threading.Lock()
+
+  @property
+  def cwd(self) -> str:
+    return self._cwd
+
+  def update(self, cwd: str) -> str:
+    if cwd:
+      self._cwd = cwd
+    return self._cwd
+
+  def observe(self, command: str, reported_cwd: str = None) -> str:
+    words = command.strip().split()
+    name = words[0] if words else ""
+
+    with self._lock:
+      previous = self._cwd
+
+      if name == "pushd":
+        self._stack.append(previous)
+      elif name == "popd" and self._stack:
+        popped = self._stack.pop()
+        if not reported_cwd:
+          reported_cwd = popped
+
+      if not reported_cwd and name in ("cd", "pushd") and len(words) > 1:
+        reported_cwd = self._resolve(previous, words[1])
+
+      return self.update(reported_cwd)
+
+  def _resolve(self, current: str, target: str) -> str:
+    if target == "-":
+      return None
+    if target.startswith("~") or target.startswith("/"):
+      return target.rstrip("/") or "/"
+    if current.startswith("~"):
+      return None
+    return posixpath.normpath(posixpath.join(current, target))
@@ -1,41 +1,14 @@
-from session import set_prompt
+from session import set_prompt, cwd_tracker, heartbeat, supervisor
 from reader import line_reader
-from utils import set_motd, ansi_sequences, log_event, resource_manager
+from utils import set_motd, log_event, resource_manager
 from connector import connect_server
+from notifier import launcher_client
 import logging
 import os
 import time
-import requests
-import threading
 
 logger = logging.getLogger(__name__)
 
-UPDATE_SESSION_URL = "http://launcher:5000/session/update/cowrie"
-_UPDATE_LOCK = threading.Lock()
-_LAST_UPDATE_AT = 0.0
-UPDATE_INTERVAL = 1.5
-
-def _post_update():
-  try:
-    requests.post(UPDATE_SESSION_URL, timeout=2)
-  except Exception:
-    logger.exception("Session update failed")
-
-def update_session(force: bool = False) -> None:
-  global _LAST_UPDATE_AT
-  now = time.time()
-
-  if not force and (now - _LAST_UPDATE_AT) < UPDATE_INTERVAL:
-    return
-
-  with _UPDATE_LOCK:
-    now = time.time()
-
-    if not force and (now - _LAST_UPDATE_AT) < UPDATE_INTERVAL:
-      return
-    _LAST_UPDATE_AT = now
-    threading.Thread(target=_post_update, daemon=True).start()
-
 def _build_dir_cmd(cwd: str) -> str:
   if not cwd or cwd == "~":
     return ""
@@ -46,26 +19,25 @@ def handle_session(chan, username: str, password: str, addr: tuple, start_time:
   dir_cmd = ""
 
   hostname = str(os.getenv('HOST_NAME'))[:9]
-  cwd = "~"
+  cwd_state = cwd_tracker.CwdTracker()
+  heartbeats = heartbeat.get_aggregator()
+  session_id = heartbeats.new_session_id()
+  sessions = supervisor.get_supervisor()
+  sessions.register(session_id, chan, cowrie_connector, transport)
 
   prompt_manager = set_prompt.PromptManager()
-  prompt = prompt_manager.get_prompt(username, hostname, cwd)
-  reader = line_reader.LineReader(chan, username, password, prompt, history, cowrie_connector)
-
-  motd_lines = set_motd.get_motd_lines(hostname)
-  chan.send(b"\r\n")
-  for line in motd_lines:
-    sent_line = line.rstrip() + "\r\n"
-    chan.send(sent_line.encode("utf-8"))
-    time.sleep(0.005)
+  prompt = prompt_manager.get_prompt(username, hostname, cwd_state.cwd)
+  reader = line_reader.LineReader(chan, username, password, prompt, history, cowrie_connector, cwd_state, on_input=lambda: sessions.touch(session_id))
 
   if mode == "yozakura" or mode == "tsubomi":
     cowrie_launched = True
-    update_session(force=True)
+    heartbeats.mark(session_id, urgent=True)
   elif cowrie_launched:
-    update_session(force=True)
+    heartbeats.mark(session_id, urgent=True)
 
   try:
+    reader.hold_output_until(set_motd.send_motd(chan, hostname))
+
     while True:
       cmd = reader.read()
 
@@ -77,7 +49,7 @@ def handle_session(chan, username: str, password: str, addr: tuple, start_time:
       except Exception:
         src_ip, src_port = "unknown", 0
 
-      log_event.log_command_event(src_ip, src_port, username, cmd, cwd, mode)
+      log_event.log_command_event(src_ip, src_port, username, cmd, cwd_state.cwd, mode)
 
       if cmd.lower() in ["exit", "quit", "exit;", "quit;"]:
         break
@@ -85,17 +57,12 @@ def handle_session(chan, username: str, password: str, addr: tuple, start_time:
       if not cowrie_launched:
         if mode == "sakura":
           history.append(cmd)
+          handoff_started = time.monotonic()
 
-          try:
-            res = requests.post("http://launcher:5000/trigger/cowrie", timeout=5)
-            if res.status_code == 200:
-              logger.info("Cowrie started. Transferring session... (sakura mode)")
-            else:
-              logger.error("Failed to start Cowrie (HTTP %s)", res.status_code)
-              chan.send(b"Service unavailable. Session terminated.\r\n")
-              break
-          except Exception:
-            logger.exception("Error triggering Cowrie")
+          if launcher_client.get_client().trigger("cowrie"):
+            logger.info("Cowrie started. Transferring session... (sakura mode)")
+          else:
+            logger.error("Failed to start Cowrie")
             chan.send(b"Service unavailable. Session terminated.\r\n")
             break
 
@@ -103,40 +70,49 @@ def handle_session(chan, username: str, password: str, addr: tuple, start_time:
 
           try:
             output, cwd = cowrie_connector.replay_history(username, password, history)
+            cwd_state.update(cwd)
           except Exception:
             logger.exception("Cowrie connection failed during replay_history")
             chan.send(b"Connection to backend lost. Session terminated.\r\n")
             break
 
-          dir_cmd = _build_dir_cmd(cwd)
-          prompt = prompt_manager.get_prompt(username, hostname, cwd)
+          reader.completion_cache.invalidate()
+
+          dir_cmd = _build_dir_cmd(cwd_state.cwd)
+          prompt = prompt_manager.get_prompt(username, hostname, cwd_state.cwd)
           reader.update_prompt(prompt)
 
-          clean_output = ansi_sequences.strip_ansi_sequences(output)
-          chan.send(clean_output.encode("utf-8"))
-          update_session(force=True)
+          chan.send(output.encode("utf-8"))
+          logger.info(
+            "Handed session over to Cowrie in %.3fs (%s commands replayed)",
+            time.monotonic() - handoff_started,
+            len(history),
+          )
+          heartbeats.mark(session_id, urgent=True)
           continue
         else:
           logger.warning("Unexpected state: cowrie not launched in mode %s", mode)
           chan.send(b"Service error. Session terminated.\r\n")
           break
 
-      dir_cmd = _build_dir_cmd(cwd)
+      dir_cmd = _build_dir_cmd(cwd_state.cwd)
 
       try:
         output, cwd = cowrie_connector.execute_command(cmd, username, password, dir_cmd)
+        cwd_state.observe(cmd, cwd)
       except Exception:
         logger.exception("Cowrie connection lost during command execution")
         chan.send(b"Connection to backend lost. Session terminated.\r\n")
         break
 
-      dir_cmd = _build_dir_cmd(cwd)
-      prompt = prompt_manager.get_prompt(username, hostname, cwd)
+      reader.completion_cache.invalidate_for(cmd)
+
+      dir_cmd = _build_dir_cmd(cwd_state.cwd)
+      prompt = prompt_manager.get_prompt(username, hostname, cwd_state.cwd)
       reader.update_prompt(prompt)
 
-      clean_output = ansi_sequences.strip_ansi_sequences(output)
-      chan.send(clean_output.encode("utf-8"))
-      update_session()
+      chan.send(output.encode("utf-8"))
+      heartbeats.mark(session_id)
 
   except EOFError:
     logger.info("Client closed connection (EOF)")
@@ -145,6 +121,9 @@ def handle_session(chan, username: str, password: str, addr: tuple, start_time:
     logger.exception("Error handling session")
 
   finally:
+    heartbeats.unregister(session_id)
+    sessions.unregister(session_id)
+
     try:
       src_ip, src_port = addr[0], addr[1]
     except Exception:
@@ -165,6 +144,11 @@ def handle_session(chan, username: str, password: str, addr: tuple, start_time:
     except Exception:
       logger.exception("Failed to cleanup terminal")
 
+    try:
+      cowrie_connector.close()
+    except Exception:
+      logger.exception("Failed to close backend shell in session cleanup")
+
     resource_manager.close_channel(chan)
 
     if transport is not None:
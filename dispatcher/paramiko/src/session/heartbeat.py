@@ -0,0 +1,102 @@
+from notifier import launcher_client
+import itertools
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = float(os.getenv("SESSION_HEARTBEAT_INTERVAL", "1.5"))
+ACTIVE_WINDOW = float(os.getenv("SESSION_ACTIVE_WINDOW", "60"))
+
+class HeartbeatAggregator:
+  def __init__(self, service: str = "cowrie", interval: float = HEARTBEAT_INTERVAL):
+    self.service = service
+    self.interval = interval
+    self._lock = threading.Lock()
+    self._wakeup = threading.Event()
+    self._ids = itertools.count(1)
+    self._sessions = {}
+    self._marks = 0
+    self._dirty = False
+    self._urgent = False
+    self._sent = 0
+    self._failed = 0
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+
+  def new_session_id(self) -> int:
+    return next(self._ids)
+
+  def mark(self, session_id: int, urgent: bool = False):
+    with self._lock:
+      self._sessions[session_id] = time.monotonic()
+      self._marks += 1
+      self._dirty = True
+      self._urgent = self._urgent or urgent
+
+    if urgent:
+      self._wakeup.set()
+
+  def unregister(self, session_id: int):
+    with self._lock:
+      if self._sessions.pop(session_id, None) is None:
+        return
+      self._dirty = True
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        "live_sessions": len(self._sessions),
+        "pending_marks": self._marks,
+        "sent": self._sent,
+        "failed": self._failed,
+      }
+
+  def _snapshot(self) -> dict:
+    with self._lock:
+      if not self._dirty:
+        return None
+
+      now = time.monotonic()
+      payload = {
+        "live_sessions": len(self._sessions),
+        "active_sessions": sum(1 for t in self._sessions.values() if now - t <= ACTIVE_WINDOW),
+        "marks": self._marks,
+        "interval": self.interval,
+      }
+      self._marks = 0
+      self._dirty = False
+      self._urgent = False
+      return payload
+
+  def _run(self):
+    while True:
+      self._wakeup.wait(self.interval)
+      self._wakeup.clear()
+
+      try:
+        payload = self._snapshot()
+        if payload is None:
+          continue
+
+        ok = launcher_client.get_client().update_session(self.service, payload)
+        with self._lock:
+          if ok:
+            self._sent += 1
+          else:
+            self._failed += 1
+      except Exception:
+        logger.exception("Heartbeat for %s failed", self.service)
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+def get_aggregator() -> HeartbeatAggregator:
+  global _aggregator
+  if _aggregator is None:
+    with _aggregator_lock:
+      if _aggregator is None:
+        _aggregator = HeartbeatAggregator()
+  return _aggregator
@@ -1,6 +1,6 @@
+from notifier import launcher_client
 from utils import resource_manager
 import logging
-import requests
 import paramiko
 
 logger = logging.getLogger(__name__)
@@ -20,9 +20,8 @@ class PromptManager:
     transport = None
 
     try:
-      res = requests.post(f"http://{self.launcher_host}:5000/trigger/cowrie", timeout=5)
-      if res.status_code != 200:
-        logger.error("Failed to trigger Cowrie: HTTP %s", res.status_code)
+      if not launcher_client.get_client().trigger("cowrie"):
+        logger.error("Failed to trigger Cowrie")
         return "~$ "
 
       client = paramiko.SSHClient()
@@ -0,0 +1,118 @@
+from utils import resource_manager, stats_reporter
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "600"))
+SESSION_MAX_DURATION = float(os.getenv("SESSION_MAX_DURATION", "3600"))
+REAP_INTERVAL = float(os.getenv("SESSION_REAP_INTERVAL", "5"))
+REAP_GRACE = 30.0
+
+class _Session:
+  def __init__(self, chan, connector, transport):
+    self.chan = chan
+    self.connector = connector
+    self.transport = transport
+    self.started_at = time.monotonic()
+    self.active_at = self.started_at
+    self.reaped_at = None
+
+class SessionSupervisor:
+  def __init__(self, idle_timeout: float = SESSION_IDLE_TIMEOUT, max_duration: float = SESSION_MAX_DURATION, interval: float = REAP_INTERVAL):
+    self.idle_timeout = idle_timeout
+    self.max_duration = max_duration
+    self.interval = interval
+    self._lock = threading.Lock()
+    self._sessions = {}
+    self._reaped = {"idle": 0, "deadline": 0, "dead": 0}
+    self._abandoned = 0
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+    stats_reporter.register("session_supervisor", self.stats)
+
+  def register(self, session_id, chan, connector=None, transport=None):
+    with self._lock:
+      self._sessions[session_id] = _Session(chan, connector, transport)
+
+  def touch(self, session_id):
+    session = self._sessions.get(session_id)
+    if session is not None:
+      session.active_at = time.monotonic()
+
+  def unregister(self, session_id):
+    with self._lock:
+      self._sessions.pop(session_id, None)
+
+  def stats(self) -> dict:
+    with self._lock:
+      return {
+        "live": len(self._sessions),
+        "reaped": dict(self._reaped),
+        "abandoned": self._abandoned,
+      }
+
+  def _reason(self, session: _Session, now: float):
+    chan = session.chan
+    transport = chan.get_transport()
+    if chan.closed or transport is None or not transport.is_active():
+      return "dead"
+    if self.max_duration > 0 and now - session.started_at >= self.max_duration:
+      return "deadline"
+    if self.idle_timeout > 0 and now - session.active_at >= self.idle_timeout:
+      return "idle"
+    return None
+
+  def _reap(self, session_id, session: _Session, reason: str):
+    logger.info("Reaping session %s (%s), supervisor stats: %s", session_id, reason, self.stats())
+    resource_manager.close_channel(session.chan)
+    if session.transport is not None:
+      resource_manager.close_transport(session.transport)
+
+  def _abandon(self, session_id, session: _Session):
+    with self._lock:
+      self._abandoned += 1
+    logger.warning("Session %s did not exit after reaping, closing its backend", session_id)
+    if session.connector is not None:
+      threading.Thread(target=session.connector.abort, daemon=True).start()
+
+  def _run(self):
+    while True:
+      time.sleep(self.interval)
+
+      try:
+        now = time.monotonic()
+        with self._lock:
+          sessions = list(self._sessions.items())
+
+        for session_id, session in sessions:
+          if session.reaped_at is not None:
+            if now - session.reaped_at >= REAP_GRACE:
+              self._abandon(session_id, session)
+              self.unregister(session_id)
+            continue
+
+          reason = self._reason(session, now)
+          if reason is None:
+            continue
+
+          session.reaped_at = now
+          with self._lock:
+            self._reaped[reason] += 1
+          self._reap(session_id, session, reason)
+
+      except Exception:
+        logger.exception("Session supervisor pass failed")
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+def get_supervisor() -> SessionSupervisor:
+  global _supervisor
+  if _supervisor is None:
+    with _supervisor_lock:
+      if _supervisor is None:
+        _supervisor = SessionSupervisor()
+  return _supervisor
@@ -1,6 +1,13 @@
+import codecs
 import re
 
 ANSI_ESCAPE_RE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+PROMPT_CWD_RE = re.compile(r"@[^:]+:(.*?)[\$#] ?")
+PROMPT_TAIL_RE = re.compile(r"@[\w.-]+:[^\r\n$#]*[$#] $")
+PROMPT_LINE_RE = re.compile(r"[\w.-]*@[\w.-]+:[^\r\n$#]*[$#] $")
+PROMPT_MARKER = "\x1b[4"
+PROMPT_WINDOW = 512
+MAX_ESCAPE_LENGTH = 64
 
 def strip_ansi_sequences(text):
   return ANSI_ESCAPE_RE.sub("", text)
@@ -22,3 +29,104 @@ def extract_command(text: str) -> str:
     return match.group(1).strip()
 
   return ""
+
+def extract_prompt_cwd(text: str) -> str:
+  match = PROMPT_CWD_RE.search(text)
+  if match:
+    return match.group(1).strip()
+
+  return None
+
+class TerminalStreamParser:
+  def __init__(self, echo: str = "", user: str = None):
+    self.echo = echo.strip()
+    self.user = user
+    self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    self._segments = []
+    self._carry = ""
+    self._length = 0
+    self._line_start = 0
+    self._marker = -1
+    self._tail = ""
+    self.prompt_seen = False
+
+  def feed(self, data: bytes) -> str:
+    text = self._carry + self._decoder.decode(data)
+    self._carry = ""
+
+    esc = text.rfind("\x1b", max(0, len(text) - MAX_ESCAPE_LENGTH))
+    if esc != -1 and not ANSI_ESCAPE_RE.match(text, esc):
+      self._carry = text[esc:]
+      text = text[:esc]
+
+    if "\x1b" in text:
+      parts = []
+      pos = 0
+      offset = self._length
+      for match in ANSI_ESCAPE_RE.finditer(text):
+        parts.append(text[pos:match.start()])
+        offset += match.start() - pos
+        if match.group().startswith(PROMPT_MARKER):
+          self._marker = offset
+        pos = match.end()
+      parts.append(text[pos:])
+      cleaned = "".join(parts)
+    else:
+      cleaned = text
+
+    if not cleaned:
+      return cleaned
+
+    newline = cleaned.rfind("\n")
+    if newline != -1:
+      self._line_start = self._length + newline + 1
+
+    self._segments.append(cleaned)
+    self._length += len(cleaned)
+    self._tail = (self._tail + cleaned)[-PROMPT_WINDOW:]
+
+    current_line = self._tail[-(self._length - self._line_start):] if self._length > self._line_start else ""
+    self.prompt_seen = bool(PROMPT_TAIL_RE.search(current_line))
+    return cleaned
+
+  def tail(self, size: int = PROMPT_WINDOW) -> str:
+    return self._tail[-size:]
+
+  def text(self) -> str:
+    return "".join(self._segments)
+
+  @property
+  def cwd(self) -> str:
+    if not self.prompt_seen:
+      return None
+    return extract_prompt_cwd(self._tail[-(self._length - self._line_start):])
+
+  def output(self) -> str:
+    text = self.text()
+    body = text[:self._line_start]
+    last_line = text[self._line_start:]
+
+    if self.prompt_seen:
+      if self._marker >= self._line_start:
+        last_line = last_line[:self._marker - self._line_start].rstrip()
+      else:
+        last_line = last_line[:self._prompt_start(last_line)].rstrip()
+
+    lines = body.split("\n")[:-1] if body else []
+
+    if self.echo:
+      for i, line in enumerate(lines):
+        if self.echo in line:
+          del lines[i]
+          break
+
+    lines.append(last_line)
+    return "\n".join(lines)
+
+  def _prompt_start(self, line: str) -> int:
+    if self.user:
+      start = line.rfind(self.user + "@")
+      if start != -1 and PROMPT_TAIL_RE.match(line, start + len(self.user)):
+        return start
+    match = PROMPT_LINE_RE.search(line)
+    return match.start() if match else len(line)
@@ -1,5 +1,344 @@
-import json
+from utils import stats_reporter
+import atexit
 import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import gzip
+import shutil
+
+logger = logging.getLogger(__name__)
+
+LOG_PATH = os.getenv("PARAMIKO_LOG_PATH", "/var/log/paramiko/paramiko.log")
+LOG_QUEUE_SIZE = int(os.getenv("PARAMIKO_LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = 256
+LOG_FLUSH_INTERVAL = float(os.getenv("PARAMIKO_LOG_FLUSH_INTERVAL", "0.5"))
+LOG_FSYNC = os.getenv("PARAMIKO_LOG_FSYNC", "never")
+FSYNC_POLICIES = ("never", "batch", "interval")
+FSYNC_INTERVAL = 5.0
+LOG_MAX_BYTES = int(os.getenv("PARAMIKO_LOG_MAX_BYTES", str(64 * 1024 * 1024)))
+LOG_MAX_AGE = float(os.getenv("PARAMIKO_LOG_MAX_AGE", "86400"))
+LOG_MAX_SEGMENTS = int(os.getenv("PARAMIKO_LOG_MAX_SEGMENTS", "60"))
+INDEX_SUFFIX = ".index.jsonl"
+DROP_LOG_INTERVAL = 5.0
+
+_encoder = json.JSONEncoder()
+
+class SegmentedLog:
+  def __init__(self, path: str = LOG_PATH, max_bytes: int = LOG_MAX_BYTES, max_age: float = LOG_MAX_AGE, max_segments: int = LOG_MAX_SEGMENTS):
+    self.path = path
+    self.directory = os.path.dirname(path) or "."
+    self.stem = os.path.splitext(os.path.basename(path))[0]
+    self.index_path = os.path.join(self.directory, self.stem + INDEX_SUFFIX)
+    self.max_bytes = max_bytes
+    self.max_age = max_age
+    self.max_segments = max(1, max_segments)
+    self._index_lock = threading.Lock()
+    self._index = self._load_index()
+    self._file = None
+    self._size = 0
+    self._events = 0
+    self._first_ts = None
+    self._last_ts = None
+    self._opened_at = time.monotonic()
+    self._recover_active()
+
+    for entry in list(self._index):
+      if not entry.get("compressed"):
+        self._compress_later(entry["segment"])
+
+  def fileno(self):
+    return self._file.fileno() if self._file is not None else None
+
+  def write(self, batch: list):
+    if self._file is None:
+      self._file = open(self.path, "a", encoding="utf-8")
+      self._opened_at = time.monotonic()
+
+    data = "".join(line for _, line in batch)
+    self._file.write(data)
+    self._file.flush()
+
+    self._size += len(data.encode("utf-8"))
+    self._events += len(batch)
+    if self._first_ts is None:
+      self._first_ts = batch[0][0]
+    self._last_ts = batch[-1][0]
+
+  def rotate_if_due(self):
+    if self._events == 0:
+      return
+
+    if self._size >= self.max_bytes or time.monotonic() - self._opened_at >= self.max_age:
+      self.rotate()
+
+  def segments(self) -> int:
+    with self._index_lock:
+      return len(self._index)
+
+  def close(self):
+    if self._file is None:
+      return
+
+    try:
+      self._file.close()
+    except Exception:
+      logger.exception("Failed to close event log")
+    finally:
+      self._file = None
+
+  def rotate(self):
+    self.close()
+
+    if self._events == 0 or not os.path.exists(self.path):
+      return
+
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    segment = f"{self.stem}-{stamp}.log"
+    os.rename(self.path, os.path.join(self.directory, segment))
+
+    with self._index_lock:
+      self._index.append({
+        "segment": segment,
+        "first_timestamp": self._first_ts,
+        "last_timestamp": self._last_ts,
+        "events": self._events,
+        "bytes": self._size,
+        "compressed": False,
+      })
+      expired = self._index[:-self.max_segments]
+      self._index = self._index[-self.max_segments:]
+      self._save_index()
+
+    for entry in expired:
+      self._remove_segment(entry["segment"])
+
+    logger.info("Rotated %s (%s events, %s bytes)", segment, self._events, self._size)
+    self._size = 0
+    self._events = 0
+    self._first_ts = None
+    self._last_ts = None
+    self._compress_later(segment)
+
+  def _compress_later(self, segment: str):
+    threading.Thread(target=self._compress, args=(segment,), daemon=True).start()
+
+  def _compress(self, segment: str):
+    source = os.path.join(self.directory, segment)
+    target = source + ".gz"
+    partial = target + ".tmp"
+
+    try:
+      if os.path.exists(source):
+        with open(source, "rb") as src, gzip.open(partial, "wb") as dst:
+          shutil.copyfileobj(src, dst)
+        os.replace(partial, target)
+      elif not os.path.exists(target):
+        logger.warning("Segment %s vanished before compression", segment)
+        return
+
+      with self._index_lock:
+        entry = next((e for e in self._index if e["segment"] == segment), None)
+        if entry is not None:
+          entry["segment"] = segment + ".gz"
+          entry["compressed"] = True
+          self._save_index()
+
+      if entry is None:
+        self._remove_segment(segment)
+      elif os.path.exists(source):
+        os.remove(source)
+
+    except Exception:
+      logger.exception("Failed to compress log segment %s", segment)
+      try:
+        os.remove(partial)
+      except OSError:
+        pass
+
+  def _remove_segment(self, segment: str):
+    for name in (segment, segment + ".gz"):
+      try:
+        os.remove(os.path.join(self.directory, name))
+      except FileNotFoundError:
+        pass
+      except Exception:
+        logger.exception("Failed to remove expired segment %s", name)
+
+  def _load_index(self) -> list:
+    entries = []
+    try:
+      with open(self.index_path, "r", encoding="utf-8") as f:
+        for line in f:
+          if line.strip():
+            entries.append(json.loads(line))
+    except FileNotFoundError:
+      pass
+    except Exception:
+      logger.exception("Failed to load segment index %s", self.index_path)
+    return entries
+
+  def _save_index(self):
+    partial = self.index_path + ".tmp"
+    with open(partial, "w", encoding="utf-8") as f:
+      for entry in self._index:
+        f.write(_encoder.encode(entry) + "\n")
+    os.replace(partial, self.index_path)
+
+  def _recover_active(self):
+    try:
+      with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+          self._size += len(line.encode("utf-8"))
+          if not line.strip():
+            continue
+          self._events += 1
+          try:
+            timestamp = json.loads(line).get("timestamp")
+          except ValueError:
+            continue
+          if self._first_ts is None:
+            self._first_ts = timestamp
+          self._last_ts = timestamp
+    except FileNotFoundError:
+      pass
+    except Exception:
+      logger.exception("Failed to scan active log %s", self.path)
+
+class EventWriter:
+  def __init__(self, path: str = LOG_PATH, queue_size: int = LOG_QUEUE_SIZE, flush_interval: float = LOG_FLUSH_INTERVAL, fsync: str = LOG_FSYNC):
+    if fsync not in FSYNC_POLICIES:
+      logger.warning("Unknown fsync policy %s, using never", fsync)
+      fsync = "never"
+
+    self.path = path
+    self.flush_interval = flush_interval
+    self.fsync = fsync
+    self._queue = queue.Queue(maxsize=max(1, queue_size))
+    self._stats_lock = threading.Lock()
+    self._queued = 0
+    self._written = 0
+    self._dropped = 0
+    self._batches = 0
+    self._last_drop_log = 0.0
+    self._last_fsync = time.monotonic()
+    self._log = SegmentedLog(path)
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+    stats_reporter.register("event_writer", self.stats)
+
+  def write(self, event: dict) -> bool:
+    try:
+      self._queue.put_nowait((event.get("timestamp"), _encoder.encode(event) + "\n"))
+    except queue.Full:
+      now = time.monotonic()
+      with self._stats_lock:
+        self._dropped += 1
+        should_log = now - self._last_drop_log >= DROP_LOG_INTERVAL
+        if should_log:
+          self._last_drop_log = now
+
+      if should_log:
+        logger.warning("Event log queue full, dropping event: %s", self.stats())
+      return False
+
+    with self._stats_lock:
+      self._queued += 1
+    return True
+
+  def flush(self, timeout: float = 5.0):
+    done = threading.Event()
+    try:
+      self._queue.put(done, timeout=timeout)
+    except queue.Full:
+      return False
+    return done.wait(timeout)
+
+  def stats(self) -> dict:
+    with self._stats_lock:
+      return {
+        "pending": self._queue.qsize(),
+        "queued": self._queued,
+        "written": self._written,
+        "dropped": self._dropped,
+        "batches": self._batches,
+        "segments": self._log.segments(),
+      }
+
+  def _collect(self):
+    batch = []
+    markers = []
+
+    try:
+      item = self._queue.get(timeout=self.flush_interval)
+    except queue.Empty:
+      return batch, markers
+
+    deadline = time.monotonic() + self.flush_interval
+
+    while True:
+      if isinstance(item, threading.Event):
+        markers.append(item)
+        break
+
+      batch.append(item)
+      if len(batch) >= LOG_BATCH_SIZE:
+        break
+
+      remaining = deadline - time.monotonic()
+      if remaining <= 0:
+        break
+
+      try:
+        item = self._queue.get(timeout=remaining)
+      except queue.Empty:
+        break
+
+    return batch, markers
+
+  def _run(self):
+    while True:
+      batch, markers = self._collect()
+
+      try:
+        if batch:
+          self._write_batch(batch)
+        fileno = self._log.fileno()
+        if self.fsync == "interval" and fileno is not None and time.monotonic() - self._last_fsync >= FSYNC_INTERVAL:
+          os.fsync(fileno)
+          self._last_fsync = time.monotonic()
+        self._log.rotate_if_due()
+      except Exception:
+        logger.exception("Failed to write %s events to %s", len(batch), self.path)
+        self._log.close()
+      finally:
+        for marker in markers:
+          marker.set()
+
+  def _write_batch(self, batch: list):
+    self._log.write(batch)
+
+    if self.fsync == "batch":
+      os.fsync(self._log.fileno())
+
+    with self._stats_lock:
+      self._written += len(batch)
+      self._batches += 1
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer() -> EventWriter:
+  global _writer
+  if _writer is None:
+    with _writer_lock:
+      if _writer is None:
+        _writer = EventWriter()
+        atexit.register(_writer.flush)
+  return _writer
 
 def log_auth_event(addr, dest_ip, dest_port, username, password, success, mode="unknown"):
   log = {
@@ -17,8 +356,7 @@ def log_auth_event(addr, dest_ip, dest_port, username, password, success, mode="
     "mode": mode
   }
 
-  with open("/var/log/paramiko/paramiko.log", "a") as f:
-    f.write(json.dumps(log) + "\n")
+  get_writer().write(log)
 
 def log_command_event(src_ip, src_port, username, command, cwd, mode="unknown"):
   log = {
@@ -32,8 +370,8 @@ def log_command_event(src_ip, src_port, username, command, cwd, mode="unknown"):
     "protocol": "ssh",
     "mode": mode
   }
-  with open("/var/log/paramiko/paramiko.log", "a") as f:
-    f.write(json.dumps(log) + "\n")
+
+  get_writer().write(log)
 
 def log_session_close(src_ip, src_port, username, duration, message, mode="unknown"):
   log = {
@@ -47,5 +385,5 @@ def log_session_close(src_ip, src_port, username, duration, message, mode="unkno
     "protocol": "ssh",
     "mode": mode
   }
-  with open("/var/log/paramiko/paramiko.log", "a") as f:
-    f.write(json.dumps(log) + "\n")
+
+  get_writer().write(log)
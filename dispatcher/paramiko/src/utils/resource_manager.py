@@ -2,16 +2,17 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-def close_channel(channel):
+def close_channel(channel, send_status: bool = True):
   if channel is None:
     return
 
   try:
     if not channel.closed:
-      try:
-        channel.send_exit_status(0)
-      except Exception:
-        pass
+      if send_status:
+        try:
+          channel.send_exit_status(0)
+        except Exception:
+          pass
 
       transport = channel.get_transport()
       if transport is not None:
@@ -1,22 +1,140 @@
 import logging
 import os
 import datetime
+import heapq
+import itertools
+import string
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+MOTD_PATH = os.getenv("MOTD_PATH", "/config/motd.txt")
+MOTD_RELOAD_CHECK_INTERVAL = 2.0
+MOTD_LINE_DELAY = float(os.getenv("MOTD_LINE_DELAY", "0"))
+
+_formatter = string.Formatter()
+
+class MotdTemplate:
+  def __init__(self, path: str = MOTD_PATH):
+    self.path = path
+    self._lock = threading.Lock()
+    self._mtime = None
+    self._checked_at = 0.0
+    self._lines = None
+
+  def _load(self):
+    now = time.monotonic()
+    if self._lines is not None and now - self._checked_at < MOTD_RELOAD_CHECK_INTERVAL:
+      return self._lines
+
+    with self._lock:
+      self._checked_at = now
+      try:
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime or self._lines is None:
+          with open(self.path, "r", encoding="utf-8") as f:
+            self._lines = [self._compile(line) for line in f]
+          self._mtime = mtime
+      except Exception:
+        logger.exception("Failed to read motd file: %s", self.path)
+        self._lines = None
+        self._mtime = None
+      return self._lines
+
+  def _compile(self, line: str):
+    parsed = list(_formatter.parse(line))
+    if any(field is not None for _, field, _, _ in parsed):
+      return (None, line)
+    return ("".join(literal for literal, _, _, _ in parsed).rstrip() + "\r\n", None)
+
+  def render_lines(self, hostname: str) -> list[str]:
+    now = datetime.datetime.now(datetime.timezone.utc).strftime("%a %b %d %H:%M:%S UTC %Y")
+    lines = self._load()
+
+    if lines is not None:
+      formatted_hostname = (hostname + ":").ljust(10)
+      try:
+        return [
+          static if static is not None else template.format(now=now, hostname=formatted_hostname).rstrip() + "\r\n"
+          for static, template in lines
+        ]
+      except Exception:
+        logger.exception("Failed to format motd file: %s", self.path)
+
+    return [f"Welcome. (Host: 192.168.100.3 Time: {now})\r\n"]
+
+  def render(self, hostname: str) -> bytes:
+    return "".join(self.render_lines(hostname)).encode("utf-8")
+
+class PacedWriter:
+  def __init__(self):
+    self._cond = threading.Condition()
+    self._heap = []
+    self._seq = itertools.count()
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+
+  def send(self, chan, chunks: list[bytes], delay: float) -> threading.Event:
+    done = threading.Event()
+    if not chunks:
+      done.set()
+      return done
+
+    with self._cond:
+      heapq.heappush(self._heap, (time.monotonic(), next(self._seq), chan, list(chunks), 0, delay, done))
+      self._cond.notify()
+    return done
+
+  def _run(self):
+    while True:
+      with self._cond:
+        while not self._heap:
+          self._cond.wait()
+        due = self._heap[0][0]
+        wait = due - time.monotonic()
+        if wait > 0:
+          self._cond.wait(wait)
+          continue
+        _, _, chan, chunks, index, delay, done = heapq.heappop(self._heap)
+
+      try:
+        chan.sendall(chunks[index])
+      except Exception:
+        logger.debug("Paced MOTD write failed", exc_info=True)
+        done.set()
+        continue
+
+      if index + 1 >= len(chunks):
+        done.set()
+        continue
+
+      with self._cond:
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), chan, chunks, index + 1, delay, done))
+
+_template = MotdTemplate()
+_pacer = None
+_pacer_lock = threading.Lock()
+
 def get_motd_lines(hostname: str) -> list[str]:
-  motd_file_path = os.path.join(os.path.dirname(__file__), "/config/motd.txt")
+  return _template.render_lines(hostname)
+
+def render_motd(hostname: str) -> bytes:
+  return _template.render(hostname)
 
-  now = datetime.datetime.now(datetime.timezone.utc).strftime("%a %b %d %H:%M:%S UTC %Y")
+def send_motd(chan, hostname: str, delay: float = MOTD_LINE_DELAY) -> threading.Event:
+  global _pacer
 
-  formatted_hostname = (hostname + ":").ljust(10)
+  if delay <= 0:
+    chan.sendall(b"\r\n" + render_motd(hostname))
+    done = threading.Event()
+    done.set()
+    return done
 
-  try:
-    with open(motd_file_path, "r", encoding="utf-8") as f:
-      lines = f.readlines()
+  if _pacer is None:
+    with _pacer_lock:
+      if _pacer is None:
+        _pacer = PacedWriter()
 
-    return [line.format(now=now, hostname=formatted_hostname) for line in lines]
-  except Exception:
-    logger.exception("Failed to read motd file: %s", motd_file_path)
-    fallback_message = f"Welcome. (Host: 192.168.100.3 Time: {now})"
-    return [fallback_message]
+  chunks = [b"\r\n"] + [line.encode("utf-8") for line in get_motd_lines(hostname)]
+  return _pacer.send(chan, chunks, delay)
@@ -0,0 +1,38 @@
+import atexit
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+STATS_LOG_INTERVAL = float(os.getenv("STATS_LOG_INTERVAL", "60"))
+
+_sources = {}
+_sources_lock = threading.Lock()
+_thread = None
+
+def register(name: str, stats_fn):
+  global _thread
+
+  with _sources_lock:
+    _sources[name] = stats_fn
+    if _thread is None and STATS_LOG_INTERVAL > 0:
+      _thread = threading.Thread(target=_run, daemon=True)
+      _thread.start()
+      atexit.register(log_stats)
+
+def log_stats():
+  with _sources_lock:
+    sources = list(_sources.items())
+
+  for name, stats_fn in sources:
+    try:
+      logger.info("[stats] %s: %s", name, stats_fn())
+    except Exception:
+      logger.exception("Failed to collect stats for %s", name)
+
+def _run():
+  stop = threading.Event()
+  while not stop.wait(STATS_LOG_INTERVAL):
+    log_stats()
@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from utils import ansi_sequences
+
+def _parse(chunks, echo="", user=None):
+  parser = ansi_sequences.TerminalStreamParser(echo, user=user)
+  for chunk in chunks:
+    parser.feed(chunk)
+  return parser
+
+class TerminalStreamParserTest(unittest.TestCase):
+  def test_strips_prompt_at_marker(self):
+    parser = _parse([b"ls\r\nfile.txt\r\n\x1b[4l\x1b[0mroot@svr04:~# "], echo="ls")
+    self.assertTrue(parser.prompt_seen)
+    self.assertEqual(parser.output(), "file.txt\r\n")
+    self.assertEqual(parser.cwd, "~")
+
+  def test_prompt_split_across_chunks(self):
+    parser = _parse([b"pwd\r\n/tmp\r\n\x1b[4", b"l\x1b[0mroot@svr04:/tmp", b"# "], echo="pwd")
+    self.assertTrue(parser.prompt_seen)
+    self.assertEqual(parser.output(), "/tmp\r\n")
+    self.assertEqual(parser.cwd, "/tmp")
+
+  def test_keeps_output_sharing_the_prompt_line_without_marker(self):
+    parser = _parse([b"echo -n hi\r\nhi root@svr04:~# "], echo="echo -n hi")
+    self.assertEqual(parser.output(), "hi")
+
+  def test_keeps_output_without_trailing_newline(self):
+    parser = _parse([b"printf hi\r\nhiroot@svr04:~# "], echo="printf hi", user="root")
+    self.assertEqual(parser.output(), "hi")
+
+  def test_keeps_output_without_trailing_newline_at_marker(self):
+    parser = _parse([b"printf hi\r\nhi\x1b[4l\x1b[0mroot@svr04:~# "], echo="printf hi")
+    self.assertEqual(parser.output(), "hi")
+
+  def test_no_prompt_keeps_everything(self):
+    parser = _parse([b"cat\r\npartial line"], echo="cat")
+    self.assertFalse(parser.prompt_seen)
+    self.assertEqual(parser.output(), "partial line")
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,12 +1,23 @@
 from app.controllers import docker_manager
+from concurrent.futures import ThreadPoolExecutor
 import docker
 import logging
 import socket
+import threading
 import time
 
 MAX_WAIT_SECONDS = 10
+EVENT_RETRY_SECONDS = 2
+SERVICE_LABEL = "com.docker.compose.service"
+HANDLED_EVENTS = ("start", "die", "stop", "kill", "create", "destroy")
 client = docker.from_env()
 
+SERVICE_DEPENDENCIES = {
+  "tanner_api": ["tanner_redis"],
+  "tanner": ["tanner_api", "tanner_phpox"],
+  "snare": ["tanner"],
+}
+
 LINKED_SERVICES = {
   "snare": ["snare", "tanner_redis", "tanner_phpox", "tanner_api", "tanner"],
 }
@@ -19,30 +30,224 @@ WAIT_CONFIG = {
 logger = logging.getLogger(__name__)
 
 
-def is_service_running(service_name):
+_state = threading.Condition()
+_containers = {}
+_cache_ready = False
+_watcher = None
+_cache_stats = {"seeds": 0, "events": 0, "inspects": 0}
+
+
+def _service_key(labels, name):
+  return (labels or {}).get(SERVICE_LABEL) or name
+
+
+def _parse_health(status_text):
+  if "(healthy)" in status_text:
+    return "healthy"
+  if "(unhealthy)" in status_text:
+    return "unhealthy"
+  if "(health: starting)" in status_text:
+    return "starting"
+  return None
+
+
+def _seed_cache():
+  global _cache_ready
+  containers = {}
+
+  for item in client.api.containers(all=True):
+    name = (item.get("Names") or ["/"])[0].lstrip("/")
+    health = _parse_health(item.get("Status", ""))
+    containers[_service_key(item.get("Labels"), name)] = {
+      "id": item.get("Id"),
+      "name": name,
+      "status": item.get("State"),
+      "health": health,
+      "has_healthcheck": True if health else (False if item.get("State") == "running" else None),
+    }
+
+  with _state:
+    _containers.clear()
+    _containers.update(containers)
+    _cache_ready = True
+    _cache_stats["seeds"] += 1
+    _state.notify_all()
+
+
+def _has_healthcheck(container_id):
+  with _state:
+    _cache_stats["inspects"] += 1
+  attrs = client.api.inspect_container(container_id)
+  return bool(attrs.get("Config", {}).get("Healthcheck"))
+
+
+def _apply_event(event):
+  action = event.get("Action") or event.get("status") or ""
+  actor = event.get("Actor", {})
+  attributes = actor.get("Attributes", {})
+  container_id = actor.get("ID") or event.get("id")
+  name = attributes.get("name", "")
+  key = _service_key(attributes, name)
+
+  if action not in HANDLED_EVENTS and not action.startswith("health_status"):
+    return
+
+  if action == "destroy":
+    with _state:
+      _cache_stats["events"] += 1
+      _containers.pop(key, None)
+      _state.notify_all()
+    return
+
+  with _state:
+    entry = _containers.get(key)
+
+  if action == "start" and (entry is None or entry["has_healthcheck"] is None):
+    try:
+      has_healthcheck = _has_healthcheck(container_id)
+    except Exception:
+      has_healthcheck = None
+  else:
+    has_healthcheck = entry["has_healthcheck"] if entry else None
+
+  with _state:
+    _cache_stats["events"] += 1
+    entry = _containers.setdefault(key, {
+      "id": container_id,
+      "name": name,
+      "status": None,
+      "health": None,
+      "has_healthcheck": has_healthcheck,
+    })
+    entry["id"] = container_id
+    entry["has_healthcheck"] = has_healthcheck
+
+    if action == "start":
+      entry["status"] = "running"
+      entry["health"] = "starting" if has_healthcheck else None
+    elif action in ("die", "stop", "kill"):
+      entry["status"] = "exited"
+      entry["health"] = None
+    elif action == "create":
+      entry["status"] = "created"
+    else:
+      entry["health"] = action.split(":", 1)[1].strip()
+      entry["has_healthcheck"] = True
+
+    _state.notify_all()
+
+
+def _watch_events():
+  global _cache_ready
+
+  while True:
+    try:
+      since = int(time.time())
+      _seed_cache()
+      for event in client.events(since=since, decode=True, filters={"type": "container"}):
+        _apply_event(event)
+      logger.warning("Docker event stream ended, reseeding container cache.")
+    except Exception:
+      logger.exception("Docker event stream failed, reseeding container cache.")
+
+    with _state:
+      _cache_ready = False
+    time.sleep(EVENT_RETRY_SECONDS)
+
+
+def _ensure_cache():
+  global _watcher
+  if _watcher is None:
+    with _state:
+      if _watcher is None:
+        _watcher = threading.Thread(target=_watch_events, daemon=True)
+        _watcher.start()
+      _state.wait_for(lambda: _cache_ready, timeout=MAX_WAIT_SECONDS)
+  return _cache_ready
+
+
+def _wait_for_state(predicate, timeout_sec):
+  with _state:
+    return _state.wait_for(predicate, timeout=timeout_sec)
+
+
+def _wait_for_running(service_name, expected, timeout_sec):
+  if _ensure_cache():
+    return _wait_for_state(lambda: _is_running_locked(service_name) == expected, timeout_sec)
+
+  start_time = time.time()
+  while time.time() - start_time <= timeout_sec:
+    if (service_name in _list_running_services()) == expected:
+      return True
+    time.sleep(0.5)
+  return False
+
+
+def _list_running_services():
   running_services = []
   for container in client.containers.list():
     labels = container.labels
-    service = labels.get("com.docker.compose.service")
+    service = labels.get(SERVICE_LABEL)
     if service and container.status == "running":
       running_services.append(service)
+  return running_services
+
+
+def container_state(service_name):
+  _ensure_cache()
+  with _state:
+    entry = _containers.get(service_name)
+    return dict(entry) if entry else None
+
+
+def cache_stats():
+  with _state:
+    return dict(_cache_stats, ready=_cache_ready, containers=len(_containers))
+
+
+def _is_running_locked(service_name):
+  entry = _containers.get(service_name)
+  return entry is not None and entry["status"] == "running"
+
 
-  return service_name in running_services
+def is_service_running(service_name):
+  if not _ensure_cache():
+    return service_name in _list_running_services()
+
+  with _state:
+    return _is_running_locked(service_name)
+
+
+def _health(service_name):
+  entry = _containers.get(service_name)
+  return entry["health"] if entry else None
+
+
+def _wait_for_health(service_name, timeout_sec):
+  try:
+    if not _ensure_cache():
+      return False
+    _wait_for_state(
+      lambda: _health(service_name) in ("healthy", None),
+      timeout_sec,
+    )
+    with _state:
+      return _health(service_name) == "healthy"
+  except Exception:
+    return False
 
 
-def _wait_for_health(container, timeout_sec):
+def _poll_health(container, timeout_sec):
+  start = time.time()
   try:
-    start = time.time()
     while time.time() - start < timeout_sec:
-      container.reload()
       health = container.attrs.get("State", {}).get("Health", {}).get("Status")
-      if health == "healthy":
-        return True
-      if health is None:
-        return False
+      if health != "starting":
+        return health == "healthy"
       time.sleep(0.5)
+      container.reload()
   except Exception:
-    return False
+    logger.exception("Failed to poll health of %s", container.name)
   return False
 
 
@@ -63,13 +268,19 @@ def _wait_service_ready(service_name):
   port = cfg.get("port")
   timeout = cfg.get("timeout", 30)
 
-  try:
-    container = client.containers.get(service_name)
-  except Exception as e:
-    logger.warning("Container %s not found: %s", service_name, e)
-    return
+  if _ensure_cache():
+    if container_state(service_name) is None:
+      logger.warning("Container %s not found", service_name)
+      return
+    healthy = _wait_for_health(service_name, timeout)
+  else:
+    try:
+      container = client.containers.get(service_name)
+    except docker.errors.NotFound:
+      logger.warning("Container %s not found", service_name)
+      return
+    healthy = _poll_health(container, timeout)
 
-  healthy = _wait_for_health(container, timeout)
   if healthy:
     logger.info("%s is healthy.", service_name)
     return
@@ -97,50 +308,122 @@ def _wait_service_ready(service_name):
       )
 
 
-def stop_services(service_names):
-  for name in service_names:
-    if not is_service_running(name):
-      logger.info("%s is already stopped.", name)
-      continue
+_boot_latency = {}
 
-    logger.info("Stopping %s...", name)
-    container = client.containers.get(name)
-    container.stop()
 
-    start_time = time.time()
-    while True:
-      if not is_service_running(name):
-        logger.info("%s is now stopped.", name)
-        break
+def service_stack(service_name):
+  stack = []
 
-      if time.time() - start_time > MAX_WAIT_SECONDS:
-        logger.warning("Timeout while stopping %s.", name)
-        break
+  def visit(name):
+    if name in stack:
+      return
+    for dependency in SERVICE_DEPENDENCIES.get(name, []):
+      visit(dependency)
+    stack.append(name)
 
-      time.sleep(0.5)
+  visit(service_name)
+  return stack
 
 
-def start_services(service_names):
+def plan_levels(service_names, include_dependencies=True):
+  names = []
   for name in service_names:
-    if is_service_running(name):
-      logger.info("%s is already running.", name)
-      _wait_service_ready(name)
+    for member in (service_stack(name) if include_dependencies else [name]):
+      if member not in names:
+        names.append(member)
+
+  depth = {}
+
+  def level_of(name):
+    if name not in depth:
+      depth[name] = 0
+      deps = [d for d in SERVICE_DEPENDENCIES.get(name, []) if d in names]
+      depth[name] = 1 + max((level_of(d) for d in deps), default=-1)
+    return depth[name]
+
+  levels = {}
+  for name in names:
+    levels.setdefault(level_of(name), []).append(name)
+  return [levels[i] for i in sorted(levels)]
+
+
+def boot_latency(service_name):
+  return _boot_latency.get(service_name)
+
+
+def _run_levels(levels, action):
+  latencies = {}
+
+  for level in levels:
+    if len(level) == 1:
+      latencies[level[0]] = action(level[0])
       continue
 
-    logger.info("Starting %s...", name)
-    container = client.containers.get(name)
-    container.start()
+    with ThreadPoolExecutor(max_workers=len(level)) as executor:
+      for name, latency in zip(level, executor.map(action, level)):
+        latencies[name] = latency
 
-    start_time = time.time()
-    while True:
-      if is_service_running(name):
-        logger.info("%s is now running.", name)
-        break
+  return latencies
 
-      if time.time() - start_time > MAX_WAIT_SECONDS:
-        logger.warning("Timeout while starting %s.", name)
-        break
 
-      time.sleep(0.5)
+def _stop_one(name):
+  started = time.monotonic()
+  if not is_service_running(name):
+    logger.info("%s is already stopped.", name)
+    return 0.0
+
+  logger.info("Stopping %s...", name)
+  container = client.containers.get(name)
+  container.stop()
 
+  if _wait_for_running(name, False, MAX_WAIT_SECONDS):
+    logger.info("%s is now stopped.", name)
+  else:
+    logger.warning("Timeout while stopping %s.", name)
+  return time.monotonic() - started
+
+
+def _start_one(name):
+  started = time.monotonic()
+  if is_service_running(name):
+    logger.info("%s is already running.", name)
     _wait_service_ready(name)
+    return 0.0
+
+  logger.info("Starting %s...", name)
+  container = client.containers.get(name)
+  container.start()
+
+  if _wait_for_running(name, True, MAX_WAIT_SECONDS):
+    logger.info("%s is now running.", name)
+  else:
+    logger.warning("Timeout while starting %s.", name)
+
+  _wait_service_ready(name)
+  latency = time.monotonic() - started
+  _boot_latency[name] = latency
+  return latency
+
+
+def stop_services(service_names):
+  started = time.monotonic()
+  levels = list(reversed(plan_levels(service_names, include_dependencies=False)))
+  latencies = _run_levels(levels, _stop_one)
+  total = time.monotonic() - started
+
+  logger.info("Stopped %s in %.2fs (%s)", service_names, total, _format_latencies(latencies))
+  return {"total": total, "services": latencies}
+
+
+def start_services(service_names):
+  started = time.monotonic()
+  levels = plan_levels(service_names)
+  latencies = _run_levels(levels, _start_one)
+  total = time.monotonic() - started
+
+  logger.info("Started %s in %.2fs (%s)", service_names, total, _format_latencies(latencies))
+  return {"total": total, "services": latencies}
+
+
+def _format_latencies(latencies):
+  return ", ".join(f"{name}={latency:.2f}s" for name, latency in latencies.items())
@@ -1,4 +1,4 @@
-from app.controllers import docker_manager, session_manager
+from app.controllers import docker_manager, session_manager, trigger_manager
 import threading
 import time
 import logging
@@ -10,6 +10,8 @@ class ModeController:
         self.current_mode = "sakura"
         self.modes = ["sakura", "yozakura", "tsubomi"]
         self.rotate_interval = 1020
+        self.version = int(time.time() * 1000)
+        self._changed = threading.Condition()
         self._start_rotation_timer()
 
     def _start_rotation_timer(self):
@@ -23,23 +25,38 @@ class ModeController:
 
     def _rotate_mode(self):
         current_idx = self.modes.index(self.current_mode)
-        next_idx = (current_idx + 1) % len(self.modes)
-        self.current_mode = self.modes[next_idx]
-        logger.info(f"[mode-rotate] -> {self.current_mode}")
-        self._apply_mode_change()
+        next_mode = self.modes[(current_idx + 1) % len(self.modes)]
+        try:
+            self._apply_mode_change(next_mode)
+        except Exception as e:
+            logger.exception(f"[mode-rotate] failed to apply {next_mode}, staying in {self.current_mode}: {e}")
+            return
+        self._publish(next_mode)
+        logger.info(f"[mode-rotate] -> {self.current_mode} (version {self.version})")
+
+    def _publish(self, mode: str):
+        with self._changed:
+            self.current_mode = mode
+            self.version += 1
+            self._changed.notify_all()
 
-    def _apply_mode_change(self):
-        if self.current_mode == "sakura":
+    def wait_for_change(self, known_version: int, timeout: float):
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != known_version, timeout=timeout)
+            return self.current_mode, self.version
+
+    def _apply_mode_change(self, mode: str):
+        if mode == "sakura":
             self._trigger_container("heralding", persist=True)
             self._stop_container("wordpot")
             self._stop_container("h0neytr4p")
             self._stop_container("cowrie")
-        elif self.current_mode == "yozakura":
+        elif mode == "yozakura":
             self._trigger_container("heralding", persist=True)
             self._trigger_container("wordpot", persist=True)
             self._trigger_container("h0neytr4p", persist=True)
             self._trigger_container("cowrie", persist=True)
-        elif self.current_mode == "tsubomi":
+        elif mode == "tsubomi":
             self._stop_container("wordpot")
             self._stop_container("heralding")
             self._trigger_container("h0neytr4p", persist=True)
@@ -49,14 +66,12 @@ class ModeController:
         try:
             session_manager.update_session(service_name, persist=persist)
 
-            service = session_manager._services.get(service_name)
-            if service:
-                with service.stop_lock:
-                    if not docker_manager.is_service_running(service_name):
-                        docker_manager.start_services([service_name])
-                        logger.info(f"Started {service_name}")
-            else:
-                logger.warning(f"Service {service_name} not found in session_manager")
+            operation = trigger_manager.trigger(service_name)
+            operation.wait()
+            if operation.error:
+                logger.warning(f"Failed to start {service_name}: {operation.error}")
+            elif operation.report is not None:
+                logger.info(f"Started {service_name}")
         except Exception as e:
             logger.exception(f"Error triggering {service_name}: {e}")
 
@@ -1,75 +1,263 @@
 from app.controllers import docker_manager
+from collections import deque
+import heapq
+import itertools
 import logging
+import os
 import threading
 import time
 
 SESSION_TIMEOUT = 300
+LOCK_RETRY_SECONDS = 1.0
+KEEP_WARM_MIN = float(os.getenv("KEEP_WARM_MIN_SECONDS", "60"))
+KEEP_WARM_MAX = float(os.getenv("KEEP_WARM_MAX_SECONDS", "1800"))
+KEEP_WARM_GAP_THRESHOLD = 10.0
+KEEP_WARM_MIN_SAMPLES = 5
+KEEP_WARM_SAMPLES = 256
+COLD_START_WEIGHT = float(os.getenv("KEEP_WARM_COLD_START_WEIGHT", "10"))
+DEFAULT_COLD_START_SECONDS = 30.0
 
 _services = {}
 _services_lock = threading.Lock()
 
 linked_map = {
-  "snare": ["tanner_redis", "tanner_phpox", "tanner_api", "tanner"]
+  "snare": [s for s in docker_manager.service_stack("snare") if s != "snare"]
 }
 
 logger = logging.getLogger(__name__)
 
+class KeepWarmModel:
+  def __init__(self, service_names):
+    self.service_names = service_names
+    self.gaps = deque(maxlen=KEEP_WARM_SAMPLES)
+    self.timeout = None
+    self.stops = 0
+    self.cold_starts = 0
+    self.warm_hits = 0
+
+  def record_arrival(self, gap, cold):
+    if gap < KEEP_WARM_GAP_THRESHOLD:
+      return
+
+    if cold:
+      self.cold_starts += 1
+    else:
+      self.warm_hits += 1
+
+    self.gaps.append(gap)
+    if len(self.gaps) >= KEEP_WARM_MIN_SAMPLES:
+      self.timeout = self._choose_timeout()
+
+  def cold_start_penalty(self):
+    latencies = [docker_manager.boot_latency(name) for name in self.service_names]
+    latencies = [latency for latency in latencies if latency]
+    return max(latencies) if latencies else DEFAULT_COLD_START_SECONDS
+
+  def _choose_timeout(self):
+    containers = len(self.service_names)
+    penalty = self.cold_start_penalty() * COLD_START_WEIGHT
+    gaps = list(self.gaps)
+    candidates = {KEEP_WARM_MIN, KEEP_WARM_MAX}
+    candidates.update(min(max(gap, KEEP_WARM_MIN), KEEP_WARM_MAX) for gap in gaps)
+
+    def cost(window):
+      return sum(gap * containers if gap <= window else window * containers + penalty for gap in gaps)
+
+    return min(sorted(candidates), key=cost)
+
+  def stats(self):
+    arrivals = self.cold_starts + self.warm_hits
+    return {
+      "timeout": self.timeout,
+      "samples": len(self.gaps),
+      "stops": self.stops,
+      "cold_starts": self.cold_starts,
+      "warm_hits": self.warm_hits,
+      "cold_start_rate": self.cold_starts / arrivals if arrivals else None,
+      "cold_start_penalty": self.cold_start_penalty(),
+    }
+
 class ServiceSession:
-  def __init__(self, service_name, linked_services=None, persist=False):
+  def __init__(self, service_name, linked_services=None, persist=False, scheduler=None):
+    self.name = service_name
     self.service_names = [service_name] + (linked_services or [])
-    self._last_trigger_time = time.time()
-    self._session_active = threading.Event()
-    self._stop_observer = threading.Event()
+    self.scheduler = scheduler or _scheduler
+    self._last_trigger_time = self.scheduler.clock()
+    self._expired = False
     self.stop_lock = threading.Lock()
     self.persist = persist
-    self._observer_thread = threading.Thread(target=self.session_observer, daemon=True)
-    self._observer_thread.start()
+    self.live_sessions = None
+    self.active_sessions = None
+    self.keep_warm = KeepWarmModel(self.service_names)
+    self.scheduler.reschedule(self)
 
   def set_persist(self, value: bool):
     self.persist = value
     if value:
-      self._session_active.set()
+      self._expired = False
+    self.scheduler.reschedule(self)
 
-  def update(self):
-    self._last_trigger_time = time.time()
-    self._session_active.set()
+  def update(self, live_sessions=None, active_sessions=None, arrival=False):
+    now = self.scheduler.clock()
+    if arrival:
+      self.keep_warm.record_arrival(now - self._last_trigger_time, cold=self._expired)
+    self._last_trigger_time = now
+    self._expired = False
+    if live_sessions is not None:
+      self.live_sessions = live_sessions
+      self.active_sessions = active_sessions
+    self.scheduler.reschedule(self)
+
+  def idle_timeout(self):
+    if not self.live_sessions and self.keep_warm.timeout is not None:
+      return self.keep_warm.timeout
+    return SESSION_TIMEOUT
+
+  def deadline(self):
+    if self.persist or self._expired:
+      return None
+    return self._last_trigger_time + self.idle_timeout()
 
   def is_active(self):
-    return self._session_active.is_set()
+    return self.persist or not self._expired
 
   def stop(self):
-    self._stop_observer.set()
-    self._session_active.set()
+    self.scheduler.unschedule(self.name)
 
-  def session_observer(self):
-    while not self._stop_observer.is_set():
-      self._session_active.clear()
+class SessionScheduler:
+  def __init__(self, clock=time.time, start_thread=True):
+    self.clock = clock
+    self._cond = threading.Condition()
+    self._heap = []
+    self._entries = {}
+    self._sessions = {}
+    self._seq = itertools.count()
+    self._thread = None
+    if start_thread:
+      self._thread = threading.Thread(target=self._run, daemon=True)
+      self._thread.start()
 
-      if self.persist:
-        self._session_active.wait(timeout=3600)
-        continue
+  def reschedule(self, session: ServiceSession):
+    deadline = session.deadline()
+
+    with self._cond:
+      self._sessions[session.name] = session
+      if deadline is None:
+        self._entries.pop(session.name, None)
+      else:
+        self._push(session.name, deadline)
+      self._cond.notify()
+
+  def _push(self, service_name, deadline):
+    with self._cond:
+      entry = (deadline, next(self._seq), service_name)
+      self._entries[service_name] = entry
+      heapq.heappush(self._heap, entry)
+
+      if len(self._heap) > 64 and len(self._heap) > 4 * len(self._entries):
+        self._heap = list(self._entries.values())
+        heapq.heapify(self._heap)
+
+  def unschedule(self, service_name: str):
+    with self._cond:
+      self._entries.pop(service_name, None)
+      self._sessions.pop(service_name, None)
+      self._cond.notify()
+
+  def next_expiries(self, now=None):
+    if now is None:
+      now = self.clock()
 
-      now = time.time()
-      timeout = SESSION_TIMEOUT - (now - self._last_trigger_time)
-      if timeout <= 0:
-        timeout = 0.1
+    with self._cond:
+      entries = sorted(self._entries.values())
+      persistent = sorted(name for name, s in self._sessions.items() if s.persist)
 
-      if self._session_active.wait(timeout):
+    table = [
+      {"service": name, "deadline": deadline, "remaining": max(0.0, deadline - now)}
+      for deadline, _, name in entries
+    ]
+    table.extend({"service": name, "deadline": None, "remaining": None} for name in persistent)
+    return table
+
+  def _pop_due(self, now):
+    due = []
+    while self._heap and self._heap[0][0] <= now:
+      entry = heapq.heappop(self._heap)
+      name = entry[2]
+      if self._entries.get(name) is not entry:
         continue
+      del self._entries[name]
+      due.append(self._sessions[name])
+    return due
+
+  def run_pending(self, now=None):
+    if now is None:
+      now = self.clock()
+
+    with self._cond:
+      due = self._pop_due(now)
+
+    if not due:
+      return []
+
+    due.sort(key=lambda s: s.name)
+    expired = []
+    locked = []
+
+    try:
+      for session in due:
+        if not session.stop_lock.acquire(blocking=False):
+          self._push(session.name, now + LOCK_RETRY_SECONDS)
+          continue
+        locked.append(session)
+
+        deadline = session.deadline()
+        if deadline is None or deadline > now:
+          self.reschedule(session)
+          continue
+        session._expired = True
+        expired.append(session)
+
+      running = []
+      for session in expired:
+        for name in session.service_names:
+          if name not in running and docker_manager.is_service_running(name):
+            running.append(name)
 
-      with self.stop_lock:
-        running_services = [
-          s for s in self.service_names
-          if docker_manager.is_service_running(s)
-        ]
-        if running_services:
-          logger.info("Stopping %s due to session timeout.", running_services)
-          docker_manager.stop_services(running_services)
-        else:
-          logger.info("Services already stopped: %s", self.service_names)
+      for session in expired:
+        if any(name in running for name in session.service_names):
+          session.keep_warm.stops += 1
 
-      logger.info("Waiting for new session to reactive for %s...", self.service_names)
-      self._session_active.wait()
+      if running:
+        logger.info("Stopping %s due to session timeout.", running)
+        docker_manager.stop_services(running)
+      elif expired:
+        logger.info("Services already stopped: %s", [s.name for s in expired])
+
+    finally:
+      for session in locked:
+        session.stop_lock.release()
+
+    for session in expired:
+      logger.info("Waiting for new session to reactive for %s...", session.service_names)
+    return [s.name for s in expired]
+
+  def _run(self):
+    while True:
+      with self._cond:
+        while True:
+          now = self.clock()
+          if self._heap and self._heap[0][0] <= now:
+            break
+          timeout = self._heap[0][0] - now if self._heap else None
+          self._cond.wait(timeout)
+
+      try:
+        self.run_pending()
+      except Exception:
+        logger.exception("Session scheduler pass failed")
+
+_scheduler = SessionScheduler()
 
 def ensure_session(service_name: str, persist: bool = False):
   with _services_lock:
@@ -88,9 +276,9 @@ def ensure_session(service_name: str, persist: bool = False):
       )
     return _services[service_name]
 
-def update_session(service_name: str, persist: bool = False):
+def update_session(service_name: str, persist: bool = False, live_sessions=None, active_sessions=None, arrival: bool = False):
   session = ensure_session(service_name, persist=persist)
-  session.update()
+  session.update(live_sessions=live_sessions, active_sessions=active_sessions, arrival=arrival)
   if persist:
     session.set_persist(True)
 
@@ -98,6 +286,14 @@ def is_session_active(service_name: str):
   with _services_lock:
     return _services.get(service_name, None) and _services[service_name].is_active()
 
+def next_expiries():
+  return _scheduler.next_expiries()
+
+def keep_warm_stats():
+  with _services_lock:
+    sessions = list(_services.values())
+  return {session.name: session.keep_warm.stats() for session in sessions}
+
 def stop_all_sessions():
   with _services_lock:
     for session in _services.values():
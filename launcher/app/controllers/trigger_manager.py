@@ -0,0 +1,102 @@
+from app.controllers import docker_manager, session_manager
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_ready = threading.Condition(_inflight_lock)
+_stats = {"started": 0, "coalesced": 0, "already_running": 0, "failed": 0}
+
+class BootOperation:
+  def __init__(self, service_name):
+    self.service_name = service_name
+    self.started_at = time.monotonic()
+    self.finished_at = None
+    self.report = None
+    self.error = None
+    self._done = threading.Event()
+
+  def done(self):
+    return self._done.is_set()
+
+  def wait(self, timeout=None):
+    return self._done.wait(timeout)
+
+  def finish(self, report=None, error=None):
+    self.report = report
+    self.error = error
+    self.finished_at = time.monotonic()
+    self._done.set()
+
+def _attach(service_name: str):
+  operation = _inflight.get(service_name)
+  if operation is not None:
+    _stats["coalesced"] += 1
+  return operation
+
+def trigger(service_name: str) -> BootOperation:
+  with _inflight_lock:
+    operation = _attach(service_name)
+    if operation is not None:
+      return operation
+
+  if docker_manager.is_service_running(service_name):
+    with _inflight_lock:
+      _stats["already_running"] += 1
+    operation = BootOperation(service_name)
+    operation.finish()
+    return operation
+
+  with _inflight_lock:
+    operation = _attach(service_name)
+    if operation is not None:
+      return operation
+
+    operation = BootOperation(service_name)
+    _inflight[service_name] = operation
+    _stats["started"] += 1
+
+  threading.Thread(target=_boot, args=(operation,), daemon=True).start()
+  return operation
+
+def _boot(operation: BootOperation):
+  name = operation.service_name
+  report = None
+  error = None
+
+  try:
+    session = session_manager.ensure_session(name)
+    with session.stop_lock:
+      if not docker_manager.is_service_running(name):
+        report = docker_manager.start_services(docker_manager.service_stack(name))
+    session_manager.update_session(name)
+  except Exception as e:
+    logger.exception("Failed to boot %s", name)
+    error = str(e)
+    with _inflight_lock:
+      _stats["failed"] += 1
+  finally:
+    with _ready:
+      _inflight.pop(name, None)
+      operation.finish(report=report, error=error)
+      _ready.notify_all()
+
+def status(service_name: str) -> str:
+  with _inflight_lock:
+    if service_name in _inflight:
+      return "starting"
+  if docker_manager.is_service_running(service_name):
+    return "ready"
+  return "stopped"
+
+def wait_ready(service_name: str, timeout: float) -> str:
+  with _ready:
+    _ready.wait_for(lambda: service_name not in _inflight, timeout=timeout)
+  return status(service_name)
+
+def stats():
+  with _inflight_lock:
+    return dict(_stats, inflight=sorted(_inflight))
@@ -1,7 +1,7 @@
 from dotenv import load_dotenv
 from flask import Blueprint, request, abort, render_template, jsonify, current_app
-from app.controllers import docker_manager, session_manager
-from app.utils import flatten
+from app.controllers import docker_manager, session_manager, trigger_manager
+from app.utils import flatten, log_segments
 import ipaddress
 import logging
 import os
@@ -10,6 +10,10 @@ import json
 
 bp = Blueprint('main', __name__)
 
+MODE_WATCH_MAX_TIMEOUT = 55.0
+READY_WAIT_MAX_TIMEOUT = 55.0
+TRIGGERABLE_SERVICES = ("heralding", "wordpot", "h0neytr4p", "snare", "cowrie")
+
 logger = logging.getLogger(__name__)
 
 load_dotenv()
@@ -57,6 +61,18 @@ def current_mode():
     return mode_controller.get_current_mode(), 200
   return "sakura", 200
 
+@bp.route('/mode/watch', methods=['GET'])
+def watch_mode():
+  mode_controller = current_app.config.get('mode_controller')
+  if not mode_controller:
+    return jsonify({'mode': 'sakura', 'version': 0}), 200
+
+  known_version = request.args.get('version', default=0, type=int)
+  timeout = min(max(request.args.get('timeout', default=25.0, type=float), 0.0), MODE_WATCH_MAX_TIMEOUT)
+
+  mode, version = mode_controller.wait_for_change(known_version, timeout)
+  return jsonify({'mode': mode, 'version': version}), 200
+
 @bp.route('/api/logs/openresty', methods=['GET'])
 def get_openresty_logs():
   file_path = os.path.join(os.path.dirname(__file__), '/data/openresty/access.log')
@@ -76,8 +92,13 @@ def get_paramiko_logs():
   file_path = os.path.join(os.path.dirname(__file__), '/data/paramiko/paramiko.log')
 
   try:
-    with open(file_path, 'r', encoding='utf-8') as f:
-      logs = [json.loads(line) for line in f if line.strip()]
+    since = log_segments.parse_timestamp(request.args.get('since'))
+    until = log_segments.parse_timestamp(request.args.get('until'))
+  except ValueError:
+    return jsonify({'error': 'since/until must be ISO 8601 timestamps'}), 400
+
+  try:
+    logs = log_segments.read_events(file_path, since=since, until=until)
 
     flat_logs = [flatten.flatten_dict(log) for log in logs]
 
@@ -162,64 +183,80 @@ def get_cowrie_logs():
   except FileNotFoundError:
     return jsonify({'error': 'cowrie.json not found'}), 404
 
-@bp.route('/trigger/heralding', methods=['POST'])
-def trigger_heralding():
-  session_manager.update_session("heralding")
+def _wants_async():
+  if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+    return True
+  return 'respond-async' in request.headers.get('Prefer', '')
 
-  with session_manager._services["heralding"].stop_lock:
-    if not docker_manager.is_service_running("heralding"):
-      docker_manager.start_services(["heralding"])
-    session_manager.update_session("heralding")
+def _trigger(service_name: str, message: str, persist: bool = False):
+  session_manager.update_session(service_name, persist=persist, arrival=True)
+  operation = trigger_manager.trigger(service_name)
 
-  return "HTTP Honeypot Triggered", 200
+  if not operation.done() and _wants_async():
+    return jsonify({'service': service_name, 'status': 'starting', 'ready': f'/ready/{service_name}'}), 202
 
-@bp.route('/trigger/wordpot', methods=['POST'])
-def trigger_wordpot():
-  session_manager.update_session("wordpot")
+  operation.wait()
+  if operation.error:
+    return jsonify({'service': service_name, 'status': 'failed', 'error': operation.error}), 503
 
-  with session_manager._services["wordpot"].stop_lock:
-    if not docker_manager.is_service_running("wordpot"):
-      docker_manager.start_services(["wordpot"])
-    session_manager.update_session("wordpot")
+  session_manager.update_session(service_name, persist=persist)
+  return message, 200
 
-  return "HTTP Honeypot Triggered", 200
+@bp.route('/ready/<service_name>', methods=['GET'])
+def ready(service_name):
+  if service_name not in TRIGGERABLE_SERVICES:
+    return jsonify({'error': f'unknown service {service_name}'}), 404
 
-@bp.route('/trigger/h0neytr4p', methods=['POST'])
-def trigger_h0neytr4p():
-  session_manager.update_session("h0neytr4p")
+  timeout = min(max(request.args.get('timeout', default=0.0, type=float), 0.0), READY_WAIT_MAX_TIMEOUT)
+  state = trigger_manager.wait_ready(service_name, timeout) if timeout else trigger_manager.status(service_name)
 
-  with session_manager._services["h0neytr4p"].stop_lock:
-    if not docker_manager.is_service_running("h0neytr4p"):
-      docker_manager.start_services(["h0neytr4p"])
-    session_manager.update_session("h0neytr4p")
+  code = {'ready': 200, 'starting': 202}.get(state, 503)
+  return jsonify({'service': service_name, 'status': state}), code
 
-  return "HTTP Honeypot Triggered", 200
+@bp.route('/trigger/stats', methods=['GET'])
+def trigger_stats():
+  return jsonify(trigger_manager.stats()), 200
 
-@bp.route('/trigger/snare', methods=['POST'])
-def trigger_snare():
-  session_manager.update_session("snare")
+@bp.route('/trigger/heralding', methods=['POST'])
+def trigger_heralding():
+  return _trigger("heralding", "HTTP Honeypot Triggered")
 
-  with session_manager._services["snare"].stop_lock:
-    if not docker_manager.is_service_running("snare"):
-      docker_manager.start_services(["snare","tanner_redis", "tanner_phpox", "tanner_api", "tanner"])
-    session_manager.update_session("snare")
+@bp.route('/trigger/wordpot', methods=['POST'])
+def trigger_wordpot():
+  return _trigger("wordpot", "HTTP Honeypot Triggered")
 
-  return "HTTP Honeypot Triggered", 200
+@bp.route('/trigger/h0neytr4p', methods=['POST'])
+def trigger_h0neytr4p():
+  return _trigger("h0neytr4p", "HTTP Honeypot Triggered")
+
+@bp.route('/trigger/snare', methods=['POST'])
+def trigger_snare():
+  return _trigger("snare", "HTTP Honeypot Triggered")
 
 @bp.route('/trigger/cowrie', methods=['POST'])
 def trigger_cowrie():
-  session_manager.update_session("cowrie")
+  return _trigger("cowrie", "SSH Honeypot Triggered")
 
-  with session_manager._services["cowrie"].stop_lock:
-    if not docker_manager.is_service_running("cowrie"):
-      docker_manager.start_services(["cowrie"])
-    session_manager.update_session("cowrie")
+@bp.route('/session/expiries', methods=['GET'])
+def session_expiries():
+  return jsonify(session_manager.next_expiries()), 200
 
-  return "SSH Honeypot Triggered", 200
+@bp.route('/session/keep-warm', methods=['GET'])
+def session_keep_warm():
+  return jsonify(session_manager.keep_warm_stats()), 200
+
+@bp.route('/docker/cache', methods=['GET'])
+def docker_cache():
+  return jsonify(docker_manager.cache_stats()), 200
 
 @bp.route('/session/update/cowrie', methods=['POST'])
 def update_cowrie_session():
-  session_manager.update_session("cowrie")
+  payload = request.get_json(silent=True) or {}
+  session_manager.update_session(
+    "cowrie",
+    live_sessions=payload.get('live_sessions'),
+    active_sessions=payload.get('active_sessions'),
+  )
   return "Updated cowrie session", 200
 
 def _ensure_session(service_name: str, persist: bool = False):
@@ -228,48 +265,23 @@ def _ensure_session(service_name: str, persist: bool = False):
 
 @bp.route('/trigger-infty/heralding', methods=['POST'])
 def trigger_infty_heralding():
-  session_manager.update_session("heralding", persist=True)
-
-  with session_manager._services["heralding"].stop_lock:
-    if not docker_manager.is_service_running("heralding"):
-      docker_manager.start_services(["heralding"])
-  return "HTTP Honeypot Triggered", 200
+  return _trigger("heralding", "HTTP Honeypot Triggered", persist=True)
 
 @bp.route('/trigger-infty/wordpot', methods=['POST'])
 def trigger_infty_wordpot():
-  session_manager.update_session("wordpot", persist=True)
-
-  with session_manager._services["wordpot"].stop_lock:
-    if not docker_manager.is_service_running("wordpot"):
-      docker_manager.start_services(["wordpot"])
-  return "HTTP Honeypot Triggered", 200
+  return _trigger("wordpot", "HTTP Honeypot Triggered", persist=True)
 
 @bp.route('/trigger-infty/h0neytr4p', methods=['POST'])
 def trigger_infty_h0neytr4p():
-  session_manager.update_session("h0neytr4p", persist=True)
-
-  with session_manager._services["h0neytr4p"].stop_lock:
-    if not docker_manager.is_service_running("h0neytr4p"):
-      docker_manager.start_services(["h0neytr4p"])
-  return "HTTP Honeypot Triggered", 200
+  return _trigger("h0neytr4p", "HTTP Honeypot Triggered", persist=True)
 
 @bp.route('/trigger-infty/snare', methods=['POST'])
 def trigger_infty_snare():
-  session_manager.update_session("snare", persist=True)
-
-  with session_manager._services["snare"].stop_lock:
-    if not docker_manager.is_service_running("snare"):
-      docker_manager.start_services(["snare","tanner_redis", "tanner_phpox", "tanner_api", "tanner"])
-  return "HTTP Honeypot Triggered", 200
+  return _trigger("snare", "HTTP Honeypot Triggered", persist=True)
 
 @bp.route('/trigger-infty/cowrie', methods=['POST'])
 def trigger_infty_cowrie():
-  session_manager.update_session("cowrie", persist=True)
-
-  with session_manager._services["cowrie"].stop_lock:
-    if not docker_manager.is_service_running("cowrie"):
-      docker_manager.start_services(["cowrie"])
-  return "SSH Honeypot Triggered", 200
+  return _trigger("cowrie", "SSH Honeypot Triggered", persist=True)
 
 @bp.route('/stop/heralding', methods=['POST'])
 def stop_heralding():
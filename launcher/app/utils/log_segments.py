@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+import gzip
+import json
+import os
+
+INDEX_SUFFIX = '.index.jsonl'
+
+def parse_timestamp(value):
+  if not value:
+    return None
+
+  parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+  if parsed.tzinfo is None:
+    parsed = parsed.replace(tzinfo=timezone.utc)
+  return parsed
+
+def load_index(log_path):
+  directory = os.path.dirname(log_path)
+  stem = os.path.splitext(os.path.basename(log_path))[0]
+  index_path = os.path.join(directory, stem + INDEX_SUFFIX)
+
+  try:
+    with open(index_path, 'r', encoding='utf-8') as f:
+      return [json.loads(line) for line in f if line.strip()]
+  except FileNotFoundError:
+    return []
+
+def _overlaps(entry, since, until):
+  first = parse_timestamp(entry.get('first_timestamp'))
+  last = parse_timestamp(entry.get('last_timestamp'))
+
+  if since is not None and last is not None and last < since:
+    return False
+  if until is not None and first is not None and first > until:
+    return False
+  return True
+
+def _open_segment(path):
+  if path.endswith('.gz'):
+    return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+  return open(path, 'r', encoding='utf-8', errors='replace')
+
+def _read_segment(path, since, until):
+  events = []
+
+  with _open_segment(path) as f:
+    for line in f:
+      if not line.strip():
+        continue
+
+      event = json.loads(line)
+      if since is not None or until is not None:
+        timestamp = parse_timestamp(event.get('timestamp'))
+        if timestamp is None:
+          continue
+        if since is not None and timestamp < since:
+          continue
+        if until is not None and timestamp > until:
+          continue
+
+      events.append(event)
+
+  return events
+
+def read_events(log_path, since=None, until=None):
+  directory = os.path.dirname(log_path)
+  events = []
+  found = False
+
+  for entry in load_index(log_path):
+    if not _overlaps(entry, since, until):
+      continue
+
+    segment = entry['segment']
+    candidates = [segment, segment + '.gz'] if not segment.endswith('.gz') else [segment]
+    for name in candidates:
+      try:
+        events.extend(_read_segment(os.path.join(directory, name), since, until))
+        found = True
+        break
+      except FileNotFoundError:
+        continue
+
+  try:
+    events.extend(_read_segment(log_path, since, until))
+    found = True
+  except FileNotFoundError:
+    if not found:
+      raise
+
+  return events
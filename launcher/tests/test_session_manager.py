@@ -0,0 +1,143 @@
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.modules.setdefault("docker", types.SimpleNamespace(from_env=lambda: None))
+
+from app.controllers import session_manager
+
+class KeepWarmModelTest(unittest.TestCase):
+  def setUp(self):
+    patcher = mock.patch.object(session_manager.docker_manager, "boot_latency", return_value=None)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def _window(self, gaps):
+    model = session_manager.KeepWarmModel(["cowrie"])
+    for gap in gaps:
+      model.record_arrival(gap, cold=False)
+    return model.timeout
+
+  def test_needs_enough_samples(self):
+    self.assertIsNone(self._window([120.0] * (session_manager.KEEP_WARM_MIN_SAMPLES - 1)))
+
+  def test_short_gaps_are_kept_warm(self):
+    self.assertEqual(self._window([120.0] * 20), 120.0)
+
+  def test_long_gaps_are_not_worth_keeping_warm(self):
+    self.assertEqual(self._window([1500.0] * 20), session_manager.KEEP_WARM_MIN)
+
+  def test_window_follows_gap_distribution(self):
+    short = self._window([90.0] * 10 + [1500.0] * 2)
+    mixed = self._window([90.0] * 4 + [240.0] * 8)
+    self.assertEqual(short, 90.0)
+    self.assertEqual(mixed, 240.0)
+
+  def test_ignores_gaps_within_a_burst(self):
+    model = session_manager.KeepWarmModel(["cowrie"])
+    model.record_arrival(1.0, cold=False)
+    self.assertEqual(model.stats()["samples"], 0)
+
+class ServiceSessionTest(unittest.TestCase):
+  def setUp(self):
+    self.now = 1000.0
+    self.scheduler = session_manager.SessionScheduler(clock=lambda: self.now, start_thread=False)
+
+  def test_refresh_does_not_record_arrival(self):
+    session = session_manager.ServiceSession("cowrie", scheduler=self.scheduler)
+    self.now += 120.0
+    session.update()
+    self.now += 120.0
+    session.update(arrival=True)
+    self.assertEqual(session.keep_warm.stats()["samples"], 1)
+
+  def test_learned_window_applies_to_services_without_session_counts(self):
+    session = session_manager.ServiceSession("wordpot", scheduler=self.scheduler)
+    self.assertEqual(session.idle_timeout(), session_manager.SESSION_TIMEOUT)
+    for _ in range(session_manager.KEEP_WARM_MIN_SAMPLES):
+      self.now += 120.0
+      session.update(arrival=True)
+    self.assertIsNone(session.live_sessions)
+    self.assertEqual(session.idle_timeout(), 120.0)
+    self.assertEqual(session.deadline(), self.now + 120.0)
+
+  def test_live_sessions_keep_the_full_timeout(self):
+    session = session_manager.ServiceSession("cowrie", scheduler=self.scheduler)
+    session.keep_warm.timeout = 90.0
+    session.update(live_sessions=2, active_sessions=1)
+    self.assertEqual(session.idle_timeout(), session_manager.SESSION_TIMEOUT)
+    session.update(live_sessions=0, active_sessions=0)
+    self.assertEqual(session.idle_timeout(), 90.0)
+
+class SessionSchedulerTest(unittest.TestCase):
+  def setUp(self):
+    self.now = 1000.0
+    self.scheduler = session_manager.SessionScheduler(clock=lambda: self.now, start_thread=False)
+    self.stopped = []
+    patchers = [
+      mock.patch.object(session_manager.docker_manager, "is_service_running", return_value=True),
+      mock.patch.object(session_manager.docker_manager, "stop_services", side_effect=self.stopped.append),
+    ]
+    for patcher in patchers:
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+  def _session(self, name, persist=False):
+    return session_manager.ServiceSession(name, persist=persist, scheduler=self.scheduler)
+
+  def test_expires_in_deadline_order(self):
+    self._session("wordpot")
+    self.now += 100.0
+    self._session("heralding")
+    timeout = session_manager.SESSION_TIMEOUT
+
+    self.assertEqual(self.scheduler.run_pending(1000.0 + timeout - 1), [])
+    self.assertEqual(self.scheduler.run_pending(1000.0 + timeout), ["wordpot"])
+    self.assertEqual(self.scheduler.run_pending(1100.0 + timeout), ["heralding"])
+    self.assertEqual(self.stopped, [["wordpot"], ["heralding"]])
+
+  def test_update_skips_stale_heap_entry(self):
+    session = self._session("wordpot")
+    self.now += 200.0
+    session.update()
+    timeout = session_manager.SESSION_TIMEOUT
+
+    self.assertEqual(self.scheduler.run_pending(1000.0 + timeout), [])
+    self.assertTrue(session.is_active())
+    self.assertEqual(self.scheduler.run_pending(1200.0 + timeout), ["wordpot"])
+    self.assertFalse(session.is_active())
+    self.assertEqual(self.stopped, [["wordpot"]])
+
+  def test_busy_stop_lock_retries_later(self):
+    session = self._session("wordpot")
+    due = 1000.0 + session_manager.SESSION_TIMEOUT
+
+    with session.stop_lock:
+      self.assertEqual(self.scheduler.run_pending(due), [])
+    self.assertEqual(self.stopped, [])
+    self.assertEqual(
+      self.scheduler.next_expiries(now=due)[0]["deadline"],
+      due + session_manager.LOCK_RETRY_SECONDS,
+    )
+
+    self.assertEqual(self.scheduler.run_pending(due + session_manager.LOCK_RETRY_SECONDS), ["wordpot"])
+    self.assertEqual(self.stopped, [["wordpot"]])
+
+  def test_next_expiries(self):
+    self._session("wordpot")
+    self.now += 100.0
+    self._session("heralding")
+    self._session("cowrie", persist=True)
+    timeout = session_manager.SESSION_TIMEOUT
+
+    self.assertEqual(self.scheduler.next_expiries(now=1150.0), [
+      {"service": "wordpot", "deadline": 1000.0 + timeout, "remaining": timeout - 150.0},
+      {"service": "heralding", "deadline": 1100.0 + timeout, "remaining": timeout - 50.0},
+      {"service": "cowrie", "deadline": None, "remaining": None},
+    ])
+
+if __name__ == "__main__":
+  unittest.main()